@@ -1,17 +1,9 @@
-import boto3
 from kink import di
 from os import environ
-from AWSIoTPythonSDK.MQTTLib import AWSIoTMQTTClient
+from uuid import uuid4
 
-di["dynamo_db"] = boto3.resource(
-    "dynamodb", region_name=environ.get("AWS_REGION", "us-east-1")
-)
-
-di["devices_table"] = di["dynamo_db"].Table(environ.get("DB_DEVICES_TABLE", "devices"))
-di["dialogs_table"] = di["dynamo_db"].Table(environ.get("DB_INTENTS_TABLE", "devices"))
-
-s3 = boto3.resource("s3")
-bucket = s3.Bucket(environ.get("S3_CERTIFICATES"))
+from alexa_api.aws import AwsClients
+from alexa_api.bootstrap import build_dynamo_db, build_iot_client
 
 S3_CERTIFICATES = environ.get("S3_CERTIFICATES")
 S3_CLIENT_CERTIFICATES = environ.get("S3_CLIENT_CERTIFICATES")
@@ -19,22 +11,34 @@ IOT_CA_ROOT = environ.get('IOT_CA_ROOT')
 IOT_PRIV_PEM = environ.get('IOT_PRIV_PEM')
 IOT_CERT_PEM = environ.get('IOT_CERT_PEM')
 IOT_ENDPOINT = environ.get("IOT_ENDPOINT")
-IOT_PORT = int(environ.get("IOT_PORT"))
+IOT_PORT = int(environ.get("IOT_PORT", 8883))
+IOT_CONNECT_TIMEOUT = int(environ.get("IOT_CONNECT_TIMEOUT", 10))
 
-for cert_file in bucket.objects.all():
-    s3.Object(S3_CERTIFICATES, cert_file.key).download_file(f"/tmp/{cert_file.key}")
+# every dependency is built on first use, so handlers only pay for what they touch
+di["dynamo_db"] = lambda _di: build_dynamo_db(_di[AwsClients])
 
-myAWSIoTMQTTShadowClient = AWSIoTMQTTClient(environ.get("IOT_CLIENT_ID", "AWSIoT"), cleanSession=False)
-myAWSIoTMQTTShadowClient.configureEndpoint(
-    IOT_ENDPOINT, IOT_PORT
+di["devices_table"] = lambda _di: _di["dynamo_db"].Table(
+    environ.get("DB_DEVICES_TABLE", "devices")
 )
-
-myAWSIoTMQTTShadowClient.configureCredentials(
-    f"/tmp/{IOT_CA_ROOT}",
-    f"/tmp/{IOT_PRIV_PEM}",
-    f"/tmp/{IOT_CERT_PEM}"
+di["dialogs_table"] = lambda _di: _di["dynamo_db"].Table(
+    environ.get("DB_INTENTS_TABLE", "devices")
+)
+di["fences_table"] = lambda _di: _di["dynamo_db"].Table(
+    environ.get("DB_FENCES_TABLE", "fences")
 )
-device_handler = myAWSIoTMQTTShadowClient
-device_handler.configureMQTTOperationTimeout(25)
 
-di["iot"] = device_handler
+# AWS IoT drops a connection when its client id connects again, so every
+# container connects under its own
+di["iot"] = lambda _di: build_iot_client(
+    _di[AwsClients],
+    f"{environ.get('IOT_CLIENT_ID', 'AWSIoT')}-{uuid4().hex}",
+    IOT_ENDPOINT,
+    IOT_PORT,
+    S3_CERTIFICATES,
+    IOT_CA_ROOT,
+    IOT_PRIV_PEM,
+    IOT_CERT_PEM,
+    IOT_CONNECT_TIMEOUT,
+)
+# resolved by IotConnection on its first connect, not when it is injected
+di["iot_provider"] = lambda _di: lambda: _di["iot"]
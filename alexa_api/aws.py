@@ -0,0 +1,51 @@
+import threading
+from os import environ
+from typing import Any, Dict, Tuple
+
+import boto3
+from botocore.config import Config
+from kink import inject
+
+from alexa_api.metrics import record_aws_calls
+
+AWS_REGION = environ.get("AWS_REGION", "us-east-1")
+AWS_CLIENT_MAX_POOL_CONNECTIONS = int(environ.get("AWS_CLIENT_MAX_POOL_CONNECTIONS", 10))
+AWS_CLIENT_MAX_ATTEMPTS = int(environ.get("AWS_CLIENT_MAX_ATTEMPTS", 3))
+AWS_CLIENT_RETRY_MODE = environ.get("AWS_CLIENT_RETRY_MODE", "standard")
+
+
+@inject
+class AwsClients:
+    """Creates every boto3 client and resource once per container and shares it"""
+
+    def __init__(self) -> None:
+        self.session = boto3.session.Session(region_name=AWS_REGION)
+        record_aws_calls(self.session)
+        self.config = Config(
+            max_pool_connections=AWS_CLIENT_MAX_POOL_CONNECTIONS,
+            retries={
+                "max_attempts": AWS_CLIENT_MAX_ATTEMPTS,
+                "mode": AWS_CLIENT_RETRY_MODE,
+            },
+        )
+        self._clients: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+
+    def client(self, service_name: str) -> Any:
+        return self._get("client", service_name)
+
+    def resource(self, service_name: str) -> Any:
+        return self._get("resource", service_name)
+
+    def _get(self, kind: str, service_name: str) -> Any:
+        key = (kind, service_name)
+        client = self._clients.get(key)
+        if client is None:
+            # sessions aren't thread safe, so clients are created one at a time
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    factory = getattr(self.session, kind)
+                    client = factory(service_name, config=self.config)
+                    self._clients[key] = client
+        return client
@@ -0,0 +1,136 @@
+import json
+import logging
+import time
+from functools import wraps
+from os import path
+from typing import Any, Callable, Dict, Iterable
+
+from AWSIoTPythonSDK.MQTTLib import AWSIoTMQTTClient
+from kink import inject
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+CERTIFICATES_DIR = "/tmp"
+IMPORTED_AT = time.time()
+
+# time spent building each lazy dependency, reported on the first invocation
+provider_timings: Dict[str, float] = {}
+
+
+def timed_provider(name: str) -> Callable:
+    def _decorator(fn: Callable) -> Callable:
+        @wraps(fn)
+        def _provide(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                provider_timings[name] = (time.perf_counter() - started) * 1000
+
+        return _provide
+
+    return _decorator
+
+
+def _etag_path(key: str) -> str:
+    return path.join(CERTIFICATES_DIR, f".{key}.etag")
+
+
+def _cached_etag(key: str) -> str:
+    if not path.exists(path.join(CERTIFICATES_DIR, key)):
+        return ""
+    try:
+        with open(_etag_path(key)) as etag_file:
+            return etag_file.read()
+    except OSError:
+        return ""
+
+
+def fetch_certificates(s3: Any, bucket_name: str, keys: Iterable[str]) -> None:
+    """Downloads the certificates that are missing in /tmp or whose ETag changed"""
+    wanted = set(keys)
+    for cert_file in s3.Bucket(bucket_name).objects.all():
+        if cert_file.key not in wanted:
+            continue
+        if _cached_etag(cert_file.key) == cert_file.e_tag:
+            continue
+        s3.Object(bucket_name, cert_file.key).download_file(
+            path.join(CERTIFICATES_DIR, cert_file.key)
+        )
+        with open(_etag_path(cert_file.key), "w") as etag_file:
+            etag_file.write(cert_file.e_tag)
+
+
+@timed_provider("dynamo_db")
+def build_dynamo_db(aws_clients: Any) -> Any:
+    return aws_clients.resource("dynamodb")
+
+
+@timed_provider("iot")
+def build_iot_client(
+    aws_clients: Any,
+    client_id: str,
+    endpoint: str,
+    port: int,
+    bucket_name: str,
+    ca_root: str,
+    private_pem: str,
+    certificate_pem: str,
+    connect_timeout: int,
+) -> AWSIoTMQTTClient:
+    fetch_certificates(
+        aws_clients.resource("s3"), bucket_name, (ca_root, private_pem, certificate_pem)
+    )
+
+    # the client id is unique to the container, nothing else resumes its session
+    client = AWSIoTMQTTClient(client_id, cleanSession=True)
+    client.configureEndpoint(endpoint, port)
+    client.configureCredentials(
+        path.join(CERTIFICATES_DIR, ca_root),
+        path.join(CERTIFICATES_DIR, private_pem),
+        path.join(CERTIFICATES_DIR, certificate_pem),
+    )
+    client.configureMQTTOperationTimeout(25)
+    # also bounds dropping a connection that expired while the container was frozen
+    client.configureConnectDisconnectTimeout(connect_timeout)
+    return client
+
+
+def inject_handler(handler: Callable) -> Callable:
+    """kink's inject, keeping the handler name the decorators above it log"""
+    return wraps(handler)(inject(handler))
+
+
+def cold_start(handler: Any) -> Any:
+    """Logs a timing report the first time a handler runs in this container"""
+    is_cold = True
+
+    @wraps(handler)
+    def execute_handler(*args, **kwargs):
+        nonlocal is_cold
+        if not is_cold:
+            return handler(*args, **kwargs)
+
+        is_cold = False
+        started = time.time()
+        try:
+            return handler(*args, **kwargs)
+        finally:
+            logger.info(
+                json.dumps(
+                    {
+                        "cold_start": handler.__name__,
+                        "init_ms": round((started - IMPORTED_AT) * 1000, 3),
+                        "first_invocation_ms": round(
+                            (time.time() - started) * 1000, 3
+                        ),
+                        "providers_ms": {
+                            name: round(elapsed, 3)
+                            for name, elapsed in provider_timings.items()
+                        },
+                    }
+                )
+            )
+
+    return execute_handler
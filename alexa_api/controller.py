@@ -1,65 +1,65 @@
 from alexa_api.types import LambdaContext, LambdaEvent, LambdaResponse, IotEvent
-from ask_sdk_core.skill_builder import SkillBuilder
+from ask_sdk_core.skill import CustomSkill
+from ask_sdk_model import RequestEnvelope
 from typing import Dict, Any
-from kink import inject
+from kink import di
+import io
 import json
 from alexa_api.iot.iot import StateMachineErr
-
-from alexa_api.intents.alexa_service import (
-    LaunchRequestHandler,
-    HelpIntentHandler,
-    CancelOrStopIntentHandler,
-    SessionEndedRequestHandler,
-    IntentReflectorHandler,
-    CatchAllExceptionHandler,
-    EnciendePiscinaIntent,
-    ApagaPiscinaIntent,
-)
+from alexa_api.intents.alexa_data import ModelEncoder, iter_json_list
 from alexa_api.intents.alexa_repository import AlexaRepository
+from alexa_api.intents.alexa_service import build_skill
 from alexa_api.devices.service import (
     DevicesService,
     CreateDeviceRequest,
     GetDeviceRequest,
+    GetDeviceListRequest,
     UpdateDeviceRequest,
     DeleteDeviceRequest,
 )
 from alexa_api.serverless import serverless
+from alexa_api.metrics import instrumented
+from alexa_api.bootstrap import cold_start, inject_handler
 from alexa_api.iot.service import (
     IIotService,
     SendOrderRequest,
+    GroupOrderRequest,
     IotToSnsDispatcherEvent,
+    IotToSnsDispatcherBatch,
 )
 
+# the skill is assembled once per container, on the first Alexa request
+di["skill"] = lambda _di: build_skill(_di[AlexaRepository])
+
 
 @serverless
-@inject
+@cold_start
+@inject_handler
 def get_config(event: LambdaEvent, context: LambdaContext, iot_service: IIotService) -> LambdaResponse:
-    result = iot_service.get_config()
-    return {"statusCode": 200, "body": json.dumps(result)}
+    body, etag = iot_service.get_config()
+    headers = {key.lower(): value for key, value in (event.get("headers") or {}).items()}
+    known = [tag.strip() for tag in headers.get("if-none-match", "").split(",")]
+    if etag in known or f"W/{etag}" in known or "*" in known:
+        return {"statusCode": 304, "headers": {"ETag": etag}, "body": ""}
+    return {"statusCode": 200, "headers": {"ETag": etag}, "body": body}
 
 
-@inject
+@instrumented
+@cold_start
+@inject_handler
 def skill_handler(
-    event: LambdaEvent, context: LambdaContext, alexa_repository: AlexaRepository
+    event: LambdaEvent, context: LambdaContext, skill: CustomSkill
 ) -> Dict[str, Any]:
-
-    sb = SkillBuilder()
-
-    sb.add_request_handler(LaunchRequestHandler(alexa_repository))
-    sb.add_request_handler(EnciendePiscinaIntent(alexa_repository))
-    sb.add_request_handler(ApagaPiscinaIntent(alexa_repository))
-    sb.add_request_handler(HelpIntentHandler(alexa_repository))
-    sb.add_request_handler(CancelOrStopIntentHandler(alexa_repository))
-    sb.add_request_handler(SessionEndedRequestHandler())
-    sb.add_request_handler(IntentReflectorHandler(alexa_repository))
-
-    sb.add_exception_handler(CatchAllExceptionHandler(alexa_repository))
-
-    lambda_handler = sb.lambda_handler()
-    return lambda_handler(event, context)
+    request_envelope = skill.serializer.deserialize(
+        payload=json.dumps(event), obj_type=RequestEnvelope
+    )
+    response_envelope = skill.invoke(request_envelope=request_envelope, context=context)
+    return skill.serializer.serialize(response_envelope)
 
 
-@inject
+@instrumented
+@cold_start
+@inject_handler
 def iot_to_sns_dispatcher(
     event: IotEvent, context: LambdaContext, iot_service: IIotService
 ) -> None:
@@ -68,8 +68,20 @@ def iot_to_sns_dispatcher(
     iot_service.dispatch_sns(dispatcher_event)
 
 
+@instrumented
+@cold_start
+@inject_handler
+def iot_to_sns_batch_dispatcher(
+    event: Any, context: LambdaContext, iot_service: IIotService
+) -> None:
+
+    dispatcher_batch = IotToSnsDispatcherBatch(event)
+    iot_service.dispatch_sns_batch(dispatcher_batch)
+
+
 @serverless
-@inject
+@cold_start
+@inject_handler
 def create_device(
     event: LambdaEvent, context: LambdaContext, devices_service: DevicesService
 ) -> LambdaResponse:
@@ -87,30 +99,42 @@ def create_device(
 
     device_resource = devices_service.create(request)
 
-    return {"statusCode": 200, "body": json.dumps(dict(device_resource))}
+    return {"statusCode": 200, "body": json.dumps(device_resource, cls=ModelEncoder)}
 
 
 @serverless
-@inject
+@cold_start
+@inject_handler
 def get_device(
     event: LambdaEvent, context: LambdaContext, devices_service: DevicesService
 ) -> LambdaResponse:
     request = GetDeviceRequest(event["pathParameters"]["device_id"])
     device_resource = devices_service.get(request)
 
-    return {"statusCode": 200, "body": json.dumps(dict(device_resource))}
+    return {"statusCode": 200, "body": json.dumps(device_resource, cls=ModelEncoder)}
 
 
 @serverless
-@inject
+@cold_start
+@inject_handler
 def get_device_list(
     event: LambdaEvent, context: LambdaContext, devices_service: DevicesService
 ) -> LambdaResponse:
-    return {"statusCode": 200, "body": json.dumps(devices_service.get_list())}
+    params = event.get("queryStringParameters") or {}
+    request = GetDeviceListRequest(params.get("limit"), params.get("next"))
+    page = devices_service.get_list(request)
+
+    extra = {"next": page.next_cursor} if page.next_cursor else {}
+    body = io.StringIO()
+    for chunk in iter_json_list("devices", page.devices, **extra):
+        body.write(chunk)
+
+    return {"statusCode": 200, "body": body.getvalue()}
 
 
 @serverless
-@inject
+@cold_start
+@inject_handler
 def update_device(
     event: LambdaEvent, context: LambdaContext, devices_service: DevicesService
 ) -> LambdaResponse:
@@ -129,11 +153,12 @@ def update_device(
     )
     device_resource = devices_service.update(request)
 
-    return {"statusCode": 200, "body": json.dumps(dict(device_resource))}
+    return {"statusCode": 200, "body": json.dumps(device_resource, cls=ModelEncoder)}
 
 
 @serverless
-@inject
+@cold_start
+@inject_handler
 def delete_device(
     event: LambdaEvent, context: LambdaContext, devices_service: DevicesService
 ) -> LambdaResponse:
@@ -143,14 +168,17 @@ def delete_device(
     return {"statusCode": 204, "body": ""}
 
 
-@inject
+@instrumented
+@cold_start
+@inject_handler
 def timer_fence(event: LambdaEvent, context: LambdaContext, iot_service: IIotService):
     print("SNS arrived :", event)
     iot_service.timer_fence(json.loads(event["Records"][0]["Sns"]["Message"]))
 
 
 @serverless
-@inject
+@cold_start
+@inject_handler
 def iot_send_order(
     event: LambdaEvent,
     context: LambdaContext,
@@ -166,7 +194,22 @@ def iot_send_order(
     return {"statusCode": 200, "body": json.dumps(iot_resource)}
 
 
-@inject
+@serverless
+@cold_start
+@inject_handler
+def iot_send_group_order(
+    event: LambdaEvent, context: LambdaContext, iot_service: IIotService
+) -> LambdaResponse:
+    body = json.loads(event["body"])
+    request = GroupOrderRequest(body.get("orders"), body.get("timeout"))
+
+    iot_resources = iot_service.send_group_order(request)
+    return {"statusCode": 200, "body": json.dumps({"orders": iot_resources})}
+
+
+@instrumented
+@cold_start
+@inject_handler
 def stop_device(
     event: LambdaEvent,
     context: LambdaContext,
@@ -0,0 +1,9 @@
+from os import environ
+
+DB_SCAN_SEGMENTS = int(environ.get("DB_SCAN_SEGMENTS", 1))
+DEVICES_CACHE_SIZE = int(environ.get("DEVICES_CACHE_SIZE", 1024))
+DEVICES_CACHE_TTL = float(environ.get("DEVICES_CACHE_TTL", 5))
+# handlers that need strongly consistent reads set this in their environment
+DEVICES_CACHE_BYPASS = environ.get("DEVICES_CACHE_BYPASS", "false").lower() == "true"
+DEVICES_PAGE_LIMIT = int(environ.get("DEVICES_PAGE_LIMIT", 100))
+DEVICES_PAGE_MAX_LIMIT = int(environ.get("DEVICES_PAGE_MAX_LIMIT", 1000))
@@ -1,13 +1,34 @@
 from typing_extensions import runtime_checkable, Protocol
-from typing import Any, Dict, Iterable, Optional, List, Generator
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from alexa_api.intents.alexa_data import Device
 from kink import inject
 from botocore.exceptions import ClientError
 from alexa_api.errors import AWSError
 from bson import ObjectId
 from boto3.dynamodb import conditions
-from alexa_api.errors import RepositoryError, RecordNotFound
+from alexa_api.errors import (
+    ApiError,
+    BadRequest,
+    RepositoryError,
+    RecordExists,
+    RecordNotFound,
+    UpdateConflict,
+)
+from alexa_api.cache import TTLCache
+from alexa_api.devices import DEVICES_CACHE_SIZE, DEVICES_CACHE_TTL, DEVICES_CACHE_BYPASS
+from dataclasses import replace
 from datetime import datetime
+import queue
+import threading
+import time
+
+BATCH_GET_LIMIT = 100
+BATCH_GET_RETRIES = 5
+TRANSACT_WRITE_LIMIT = 100
+UNIQUE_ATTRIBUTES = ("position", "GPIO")
+# key of the item holding the running timer fence execution of a device
+TIMER_KEY = "timer#{}"
 
 
 @runtime_checkable
@@ -15,22 +36,34 @@ class IDevicesRepository(Protocol):
     def insert(self, device: Device) -> None:
         ...
 
-    def get(self, device_id: ObjectId) -> Device:
+    def get(self, device_id: ObjectId, consistent: bool = False) -> Device:
         ...
 
-    def update(self, device: Device) -> None:
+    def update_fields(
+        self,
+        device_id: ObjectId,
+        fields: Dict[str, Any],
+        expected: Optional[Device] = None,
+    ) -> None:
         ...
 
     def delete(self, device_id: ObjectId) -> None:
         ...
 
-    def position_exists(self, position: int) -> Optional[ObjectId]:
+    def get_list(self, segments: int = 1) -> Iterable[Device]:
         ...
 
-    def gpio_exists(self, gpio: int) -> Optional[ObjectId]:
+    def get_page(
+        self, limit: int, start_key: Optional[Dict] = None
+    ) -> Tuple[List[Device], Optional[Dict]]:
         ...
 
-    def get_list(self) -> Iterable[Device]:
+    def scan(
+        self,
+        attributes: Optional[List[str]] = None,
+        filter_expression: Any = None,
+        segments: int = 1,
+    ) -> Iterator[Dict]:
         ...
 
     def get_device_fence_list(
@@ -38,23 +71,62 @@ class IDevicesRepository(Protocol):
     ) -> Iterable[Device]:
         ...
 
+    def get_fencing_devices(self, device_id: ObjectId) -> Iterable[Device]:
+        ...
 
-@inject(alias=IDevicesRepository)
+    def get_many(self, device_ids: Iterable[ObjectId]) -> Iterator[Device]:
+        ...
+
+    def invalidate(self, device_id: Optional[ObjectId] = None) -> None:
+        ...
+
+
+@inject
 class DevicesRepository(IDevicesRepository):
-    def __init__(self, devices_table: Any):
+    def __init__(self, devices_table: Any, fences_table: Any):
         self.table = devices_table
+        # reverse fence index: one item per (fenced_id, device_id) pair, meaning
+        # device_id can't be turned on while fenced_id is on
+        self.fences_table = fences_table
 
     def insert(self, device: Device) -> None:
+        item = device.to_item()
+        key = item["device_id"]
+
+        # uniqueness and fence existence are checked by the same transaction
+        # that writes the device, so concurrent writers can't both succeed
+        transaction: List[Dict] = [
+            {
+                "Put": {
+                    "TableName": self.table.name,
+                    "Item": item,
+                    "ConditionExpression": "attribute_not_exists(device_id)",
+                }
+            }
+        ]
+        errors: List[Optional[Callable]] = [
+            lambda reason: RecordExists(f"Device {key} already exists")
+        ]
+        for attribute in UNIQUE_ATTRIBUTES:
+            transaction.append(self._unique_put(attribute, item[attribute], key))
+            errors.append(self._unique_error(attribute))
+        # DynamoDB rejects a transaction touching the same item twice
+        for fenced_id in dict.fromkeys(item.get("device_fence", [])):
+            transaction += [self._fence_check(fenced_id), self._fence_put(fenced_id, key)]
+            errors += [self._fence_error(fenced_id), None]
+
         try:
-            self.table.put_item(Item=dict(device.serialize()))
+            self._transact_write(transaction, errors)
         except ClientError as e:
             raise AWSError(
                 f"AWS error {e.response['Error']['Code']} inserting {str(device.device_id)}"
             ) from e
 
-    def get(self, device_id: ObjectId) -> Device:
+    def get(self, device_id: ObjectId, consistent: bool = False) -> Device:
         condition = conditions.Key("device_id").eq(str(device_id))
-        result = self.table.query(KeyConditionExpression=condition)
+        result = self.table.query(
+            KeyConditionExpression=condition, ConsistentRead=consistent
+        )
 
         if result["ResponseMetadata"]["HTTPStatusCode"] not in range(200, 300):
             raise RepositoryError("error occurred when retrieving device details")
@@ -64,95 +136,544 @@ class DevicesRepository(IDevicesRepository):
 
         return self._hydrate_device(result["Items"][0])
 
-    def update(self, device: Device) -> None:
+    def update_fields(
+        self,
+        device_id: ObjectId,
+        fields: Dict[str, Any],
+        expected: Optional[Device] = None,
+    ) -> None:
+        if not fields:
+            return
 
-        device_id = device.device_id
-        device.updated_at = datetime.utcnow()
-        record = dict(device.serialize())
-        record.pop("device_id")
-        update_set_expr = "set " + ", ".join(f"#{k} = :{k}" for k, v in record.items())
-        attr_set_names = {f"#{k}": k for k, v in record.items()}
-        attr_values = {f":{k}": v for k, v in record.items()}
+        record: Dict[str, Any] = {
+            key: [str(element) for element in value]
+            if key == "device_fence" and value is not None
+            else value
+            for key, value in fields.items()
+            if key not in ("device_id", "updated_at")
+        }
+        record["updated_at"] = int(datetime.utcnow().timestamp())
 
         try:
-            self.table.update_item(
-                Key={"device_id": str(device_id)},
-                UpdateExpression=update_set_expr,
-                ExpressionAttributeValues=attr_values,
-                ExpressionAttributeNames=attr_set_names,
-                ReturnValues="ALL_NEW",
-            )
+            if expected is None and any(
+                key in record for key in ("device_fence",) + UNIQUE_ATTRIBUTES
+            ):
+                # their index items have to change in the same write as the device
+                expected = self.get(device_id, consistent=True)
+            if expected is None:
+                self._update_item(device_id, record)
+            else:
+                self._update_transaction(device_id, record, expected)
         except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                raise RecordNotFound(f"Device {str(device_id)} doesn't exist") from e
             raise AWSError(
                 f"AWS error {e.response['Error']['Code']} updating record {str(device_id)}"
             ) from e
 
+    def _update_item(self, device_id: ObjectId, record: Dict[str, Any]) -> None:
+        # a device deleted meanwhile must not come back as a partial item
+        self.table.update_item(
+            Key={"device_id": str(device_id)},
+            ConditionExpression="attribute_exists(device_id)",
+            **self._update_expression(record),
+        )
+
+    def _update_transaction(
+        self, device_id: ObjectId, record: Dict[str, Any], expected: Device
+    ) -> None:
+        key = str(device_id)
+        update = {
+            "TableName": self.table.name,
+            "Key": {"device_id": key},
+            **self._update_expression(record),
+        }
+        # optimistic concurrency: every write bumps the version, so nobody else
+        # may have written since `expected` was read
+        update["ExpressionAttributeValues"][":expected_version"] = expected.version
+        update["ConditionExpression"] = (
+            "#version = :expected_version"
+            if expected.version
+            else "attribute_exists(device_id) AND attribute_not_exists(#version)"
+            " OR #version = :expected_version"
+        )
+
+        transaction: List[Dict] = [{"Update": update}]
+        errors: List[Optional[Callable]] = [
+            lambda reason: UpdateConflict(f"Device {key} was modified by another request")
+        ]
+        for attribute in UNIQUE_ATTRIBUTES:
+            old_value = getattr(expected, attribute)
+            if attribute in record and record[attribute] != old_value:
+                transaction += [
+                    self._unique_put(attribute, record[attribute], key),
+                    self._unique_delete(attribute, old_value, key),
+                ]
+                errors += [self._unique_error(attribute), None]
+        if "device_fence" in record:
+            old_fence = {str(element) for element in expected.device_fence or []}
+            new_fence = set(record["device_fence"] or [])
+            for fenced_id in new_fence - old_fence:
+                if fenced_id != key:
+                    transaction.append(self._fence_check(fenced_id))
+                    errors.append(self._fence_error(fenced_id))
+                transaction.append(self._fence_put(fenced_id, key))
+                errors.append(None)
+            for fenced_id in old_fence - new_fence:
+                transaction.append(self._fence_delete(fenced_id, key))
+                errors.append(None)
+
+        self._transact_write(transaction, errors)
+
+    @staticmethod
+    def _update_expression(record: Dict[str, Any]) -> Dict[str, Any]:
+        to_set = {k: v for k, v in record.items() if v is not None}
+        to_remove = [k for k, v in record.items() if v is None]
+        update_expr = "set " + ", ".join(f"#{k} = :{k}" for k in to_set)
+        if to_remove:
+            update_expr += " remove " + ", ".join(f"#{k}" for k in to_remove)
+        update_expr += " add #version :one"
+        return {
+            "UpdateExpression": update_expr,
+            "ExpressionAttributeNames": {
+                **{f"#{k}": k for k in record},
+                "#version": "version",
+            },
+            "ExpressionAttributeValues": {
+                **{f":{k}": v for k, v in to_set.items()},
+                ":one": 1,
+            },
+        }
+
     def delete(self, device_id: ObjectId) -> None:
+        device = self.get(device_id)
+        key = str(device_id)
+        updated_at = int(datetime.utcnow().timestamp())
+
+        # only the devices referencing this one are touched, not the whole table
+        transaction = []
+        errors: List[Optional[Callable]] = []
+        for fencing_device in self.get_fencing_devices(device_id):
+            fence = [
+                str(element)
+                for element in fencing_device.device_fence or []
+                if element != device_id
+            ]
+            transaction.append(
+                {
+                    "Update": {
+                        "TableName": self.table.name,
+                        "Key": {"device_id": str(fencing_device.device_id)},
+                        "ConditionExpression": "attribute_exists(device_id)",
+                        "UpdateExpression": (
+                            "set #device_fence = :device_fence, #updated_at = :updated_at"
+                            " add #version :one"
+                        ),
+                        "ExpressionAttributeNames": {
+                            "#device_fence": "device_fence",
+                            "#updated_at": "updated_at",
+                            "#version": "version",
+                        },
+                        "ExpressionAttributeValues": {
+                            ":device_fence": fence,
+                            ":updated_at": updated_at,
+                            ":one": 1,
+                        },
+                    }
+                }
+            )
+            transaction.append(self._fence_delete(key, str(fencing_device.device_id)))
+            errors += [
+                lambda reason: UpdateConflict(
+                    f"A device fencing {key} was deleted meanwhile, try again"
+                ),
+                None,
+            ]
+
+        transaction += [
+            self._fence_delete(fenced_id, key)
+            for fenced_id in dict.fromkeys(map(str, device.device_fence or []))
+        ]
+        transaction += [
+            self._unique_delete(attribute, getattr(device, attribute), key)
+            for attribute in UNIQUE_ATTRIBUTES
+        ]
+        transaction.append(
+            {
+                "Delete": {
+                    "TableName": self.table.name,
+                    "Key": {"device_id": TIMER_KEY.format(key)},
+                }
+            }
+        )
+        transaction.append(
+            {"Delete": {"TableName": self.table.name, "Key": {"device_id": key}}}
+        )
+
         try:
-            self.table.delete_item(Key={"device_id": str(device_id)})
+            self._transact_write(transaction, errors)
         except ClientError as e:
             raise AWSError(
                 f"AWS error {e.response['Error']['Code']} updating record {str(device_id)}"
             ) from e
 
-    def position_exists(self, position: int) -> Optional[ObjectId]:
-        condition = conditions.Key("position").eq(position)
-        result = self.table.query(
-            IndexName="by_position", KeyConditionExpression=condition
-        )
+    def get_list(self, segments: int = 1) -> Iterable[Device]:
+        found = False
+        for item in self.scan(segments=segments):
+            found = True
+            yield self._hydrate_device(item)
 
-        if result["ResponseMetadata"]["HTTPStatusCode"] not in range(200, 300):
-            raise RepositoryError("error occurred when retrieving device details")
+        if not found:
+            raise RecordNotFound("No devices yet")
 
-        if result["Items"]:
-            return ObjectId(result["Items"][0]["device_id"])
-        return None
+    def get_page(
+        self, limit: int, start_key: Optional[Dict] = None
+    ) -> Tuple[List[Device], Optional[Dict]]:
+        scan_kwargs: Dict[str, Any] = {
+            "FilterExpression": conditions.Attr("owner_id").not_exists()
+        }
+        if start_key:
+            scan_kwargs["ExclusiveStartKey"] = start_key
 
-    def gpio_exists(self, gpio: int) -> Optional[ObjectId]:
-        condition = conditions.Key("GPIO").eq(gpio)
-        result = self.table.query(IndexName="by_GPIO", KeyConditionExpression=condition)
+        # Limit counts evaluated items, sentinels included, and every device
+        # has one per unique attribute, so this usually fills a page in one call
+        scan_limit = limit * (1 + len(UNIQUE_ATTRIBUTES))
+        devices: List[Device] = []
+        while True:
+            result = self.table.scan(Limit=scan_limit, **scan_kwargs)
+            if result["ResponseMetadata"]["HTTPStatusCode"] not in range(200, 300):
+                raise RepositoryError("error occurred when retrieving device details")
 
-        if result["ResponseMetadata"]["HTTPStatusCode"] not in range(200, 300):
-            raise RepositoryError("error occurred when retrieving device details")
+            devices += [self._hydrate_device(item) for item in result["Items"]]
+            last_key = result.get("LastEvaluatedKey")
+            if len(devices) > limit:
+                # the next page resumes right after the last device of this one
+                devices = devices[:limit]
+                return devices, {"device_id": str(devices[-1].device_id)}
+            if not last_key or len(devices) == limit:
+                return devices, last_key
+            scan_kwargs["ExclusiveStartKey"] = last_key
 
-        if result["Items"]:
-            return ObjectId(result["Items"][0]["device_id"])
-        return None
+    def scan(
+        self,
+        attributes: Optional[List[str]] = None,
+        filter_expression: Any = None,
+        segments: int = 1,
+    ) -> Iterator[Dict]:
+        # position/GPIO sentinel items are not devices
+        devices_only = conditions.Attr("owner_id").not_exists()
+        scan_kwargs: Dict[str, Any] = {"FilterExpression": devices_only}
+        if attributes:
+            scan_kwargs["ProjectionExpression"] = ", ".join(f"#{k}" for k in attributes)
+            scan_kwargs["ExpressionAttributeNames"] = {f"#{k}": k for k in attributes}
+        if filter_expression is not None:
+            scan_kwargs["FilterExpression"] = devices_only & filter_expression
 
-    def get_list(self) -> Iterable[Device]:
-        result = self.table.scan()
-        if result["ResponseMetadata"]["HTTPStatusCode"] not in range(200, 300):
-            raise RepositoryError("error occurred when retrieving device details")
+        if segments <= 1:
+            for page in self._scan_pages(scan_kwargs):
+                yield from page
+            return
 
-        if not result["Count"]:
-            raise RecordNotFound(f"No devices yet")
-        for item in result["Items"]:
-            yield self._hydrate_device(item)
+        yield from self._parallel_scan(scan_kwargs, segments)
+
+    def _scan_pages(self, scan_kwargs: Dict) -> Iterator[List[Dict]]:
+        while True:
+            result = self.table.scan(**scan_kwargs)
+            if result["ResponseMetadata"]["HTTPStatusCode"] not in range(200, 300):
+                raise RepositoryError("error occurred when retrieving device details")
+
+            yield result["Items"]
+
+            if "LastEvaluatedKey" not in result:
+                return
+            scan_kwargs = {**scan_kwargs, "ExclusiveStartKey": result["LastEvaluatedKey"]}
+
+    def _parallel_scan(self, scan_kwargs: Dict, segments: int) -> Iterator[Dict]:
+        # segments are scanned in worker threads; pages are handed over through a
+        # bounded queue so memory stays flat however large the table is
+        pages: queue.Queue = queue.Queue(maxsize=segments * 2)
+        stop = threading.Event()
+        done = object()
+
+        def put(page: Any) -> None:
+            while not stop.is_set():
+                try:
+                    pages.put(page, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def scan_segment(segment: int) -> None:
+            try:
+                segment_kwargs = {**scan_kwargs, "Segment": segment, "TotalSegments": segments}
+                for page in self._scan_pages(segment_kwargs):
+                    if stop.is_set():
+                        return
+                    put(page)
+            except Exception as e:
+                put(e)
+            finally:
+                put(done)
+
+        executor = ThreadPoolExecutor(max_workers=segments)
+        try:
+            for segment in range(segments):
+                executor.submit(scan_segment, segment)
+
+            pending = segments
+            while pending:
+                page = pages.get()
+                if page is done:
+                    pending -= 1
+                    continue
+                if isinstance(page, Exception):
+                    raise page
+                yield from page
+        finally:
+            stop.set()
+            executor.shutdown(wait=True)
 
     def get_device_fence_list(
         self, devices: Optional[List[ObjectId]]
     ) -> Iterable[Device]:
         if not devices:
             return
-        for device in devices:
-            yield self.get(device)
-
-    def _hydrate_device(self, item: Dict) -> Device:
-        return Device(
-            device_id=ObjectId(item["device_id"]),
-            name=item["name"],
-            description=item.get("description"),
-            position=int(item["position"]),
-            GPIO=int(item["GPIO"]),
-            status=item.get("status"),
-            weather_fence=int(item.get("weather_fence", 0)),
-            timer_fence=int(item.get("timer_fence", 0)),
-            device_fence=self._hydrate_device_fence(item.get("device_fence")),
-            updated_at=item.get("updated_at", datetime.utcnow())
-        )
+        missing = {str(device_id) for device_id in devices}
+        for device in self.get_many(devices):
+            missing.discard(str(device.device_id))
+            yield device
+
+        if missing:
+            raise RecordNotFound(f"Device with id {missing.pop()} was not found")
+
+    def get_many(self, device_ids: Iterable[ObjectId]) -> Iterator[Device]:
+        # devices are yielded as each batch arrives, so callers can stop early
+        keys = [{"device_id": key} for key in dict.fromkeys(map(str, device_ids))]
+        client = self.table.meta.client
+
+        for start in range(0, len(keys), BATCH_GET_LIMIT):
+            request = {self.table.name: {"Keys": keys[start : start + BATCH_GET_LIMIT]}}
+            attempt = 0
+            while request:
+                try:
+                    result = client.batch_get_item(RequestItems=request)
+                except ClientError as e:
+                    raise AWSError(
+                        f"AWS error {e.response['Error']['Code']} retrieving devices"
+                    ) from e
+
+                for item in result["Responses"].get(self.table.name, []):
+                    yield self._hydrate_device(item)
+
+                request = result.get("UnprocessedKeys")
+                if request:
+                    attempt += 1
+                    if attempt > BATCH_GET_RETRIES:
+                        raise RepositoryError("error occurred when retrieving device details")
+                    time.sleep(min(0.05 * 2 ** attempt, 1))
+
+    def get_fencing_devices(self, device_id: ObjectId) -> Iterable[Device]:
+        condition = conditions.Key("fenced_id").eq(str(device_id))
+        query_kwargs: Dict[str, Any] = {"KeyConditionExpression": condition}
+        fencing_ids: List[str] = []
+        while True:
+            result = self.fences_table.query(**query_kwargs)
+            if result["ResponseMetadata"]["HTTPStatusCode"] not in range(200, 300):
+                raise RepositoryError("error occurred when retrieving device fences")
+            fencing_ids += [item["device_id"] for item in result["Items"]]
+            if "LastEvaluatedKey" not in result:
+                break
+            query_kwargs["ExclusiveStartKey"] = result["LastEvaluatedKey"]
+
+        return self.get_many(ObjectId(fencing_id) for fencing_id in fencing_ids)
+
+    def invalidate(self, device_id: Optional[ObjectId] = None) -> None:
+        # nothing is cached at this level
+        return
+
+    def _transact_write(
+        self, transaction: List[Dict], errors: Optional[List[Optional[Callable]]] = None
+    ) -> None:
+        # errors[i] builds the ApiError raised when the condition of item i fails,
+        # items past the end of errors have none
+        if not transaction:
+            return
+        # split in several calls it would no longer be atomic
+        if len(transaction) > TRANSACT_WRITE_LIMIT:
+            raise BadRequest(
+                f"Too many fences to write at once, {len(transaction)} items"
+                f" where the limit is {TRANSACT_WRITE_LIMIT}"
+            )
+        try:
+            self.table.meta.client.transact_write_items(TransactItems=transaction)
+        except ClientError as e:
+            if errors and e.response["Error"]["Code"] == "TransactionCanceledException":
+                reasons = e.response.get("CancellationReasons", [])
+                for index, reason in enumerate(reasons):
+                    error = errors[index] if index < len(errors) else None
+                    if reason.get("Code") == "ConditionalCheckFailed" and error:
+                        raise error(reason) from e
+            raise
+
+    def _unique_put(self, attribute: str, value: Any, owner_id: str) -> Dict:
+        # sentinel item owning a position/GPIO, invisible to scans and indexes
+        return {
+            "Put": {
+                "TableName": self.table.name,
+                "Item": {"device_id": f"{attribute}#{int(value)}", "owner_id": owner_id},
+                "ConditionExpression": "attribute_not_exists(device_id) OR owner_id = :owner_id",
+                "ExpressionAttributeValues": {":owner_id": owner_id},
+                "ReturnValuesOnConditionCheckFailure": "ALL_OLD",
+            }
+        }
+
+    def _unique_delete(self, attribute: str, value: Any, owner_id: str) -> Dict:
+        return {
+            "Delete": {
+                "TableName": self.table.name,
+                "Key": {"device_id": f"{attribute}#{int(value)}"},
+                "ConditionExpression": "attribute_not_exists(device_id) OR owner_id = :owner_id",
+                "ExpressionAttributeValues": {":owner_id": owner_id},
+            }
+        }
+
+    @staticmethod
+    def _unique_error(attribute: str) -> Callable:
+        def _error(reason: Dict) -> ApiError:
+            owner = reason.get("Item", {}).get("owner_id")
+            if isinstance(owner, dict):
+                owner = owner.get("S")
+            return RecordExists(f"this {attribute} is already used by device {owner}")
+
+        return _error
+
+    def _fence_check(self, fenced_id: str) -> Dict:
+        return {
+            "ConditionCheck": {
+                "TableName": self.table.name,
+                "Key": {"device_id": fenced_id},
+                "ConditionExpression": "attribute_exists(device_id)",
+            }
+        }
 
     @staticmethod
-    def _hydrate_device_fence(item: Optional[List[str]]) -> Optional[List[ObjectId]]:
-        if not item:
-            return None
-        return [ObjectId(element) for element in item]
+    def _fence_error(fenced_id: str) -> Callable:
+        return lambda reason: RecordNotFound(f"Device with id {fenced_id} was not found")
+
+    def _fence_put(self, fenced_id: str, device_id: str) -> Dict:
+        return {
+            "Put": {
+                "TableName": self.fences_table.name,
+                "Item": {"fenced_id": fenced_id, "device_id": device_id},
+            }
+        }
+
+    def _fence_delete(self, fenced_id: str, device_id: str) -> Dict:
+        return {
+            "Delete": {
+                "TableName": self.fences_table.name,
+                "Key": {"fenced_id": fenced_id, "device_id": device_id},
+            }
+        }
+
+    @staticmethod
+    def _hydrate_device(item: Dict) -> Device:
+        return Device.from_item(item)
+
+
+@inject(alias=IDevicesRepository)
+class CachedDevicesRepository(IDevicesRepository):
+    """Read-through LRU+TTL cache in front of DevicesRepository.
+
+    Local writes refresh or drop the cached entries; reported-state messages
+    invalidate them through `invalidate`. Reads marked as consistent, or every
+    read when DEVICES_CACHE_BYPASS is set, go straight to DynamoDB.
+    """
+
+    def __init__(self, devices_repository: DevicesRepository):
+        self.devices_repository = devices_repository
+        self.cache = TTLCache(DEVICES_CACHE_SIZE, DEVICES_CACHE_TTL)
+        self.bypass = DEVICES_CACHE_BYPASS
+
+    def insert(self, device: Device) -> None:
+        self.devices_repository.insert(device)
+        self.cache.set(str(device.device_id), self._copy(device))
+
+    def get(self, device_id: ObjectId, consistent: bool = False) -> Device:
+        if not (consistent or self.bypass):
+            device = self.cache.get(str(device_id))
+            if device:
+                return self._copy(device)
+
+        device = self.devices_repository.get(device_id, consistent)
+        self.cache.set(str(device_id), self._copy(device))
+        return device
+
+    def update_fields(
+        self,
+        device_id: ObjectId,
+        fields: Dict[str, Any],
+        expected: Optional[Device] = None,
+    ) -> None:
+        self.devices_repository.update_fields(device_id, fields, expected)
+        # after the write, a get racing it could cache the old item again
+        self.cache.invalidate(str(device_id))
+
+    def delete(self, device_id: ObjectId) -> None:
+        self.devices_repository.delete(device_id)
+        # fencing devices are rewritten too, so nothing cached can be trusted
+        self.cache.clear()
+
+    def get_list(self, segments: int = 1) -> Iterable[Device]:
+        return self.devices_repository.get_list(segments)
+
+    def get_page(
+        self, limit: int, start_key: Optional[Dict] = None
+    ) -> Tuple[List[Device], Optional[Dict]]:
+        return self.devices_repository.get_page(limit, start_key)
+
+    def scan(
+        self,
+        attributes: Optional[List[str]] = None,
+        filter_expression: Any = None,
+        segments: int = 1,
+    ) -> Iterator[Dict]:
+        return self.devices_repository.scan(attributes, filter_expression, segments)
+
+    def get_device_fence_list(
+        self, devices: Optional[List[ObjectId]]
+    ) -> Iterable[Device]:
+        # fence statuses decide whether an order is admitted, so they are read live
+        return self.devices_repository.get_device_fence_list(devices)
+
+    def get_fencing_devices(self, device_id: ObjectId) -> Iterable[Device]:
+        return self.devices_repository.get_fencing_devices(device_id)
+
+    def get_many(self, device_ids: Iterable[ObjectId]) -> Iterator[Device]:
+        uncached = []
+        for device_id in device_ids:
+            device = None if self.bypass else self.cache.get(str(device_id))
+            if device:
+                yield self._copy(device)
+            else:
+                uncached.append(device_id)
+
+        for device in self.devices_repository.get_many(uncached):
+            self.cache.set(str(device.device_id), self._copy(device))
+            yield device
+
+    def invalidate(self, device_id: Optional[ObjectId] = None) -> None:
+        if device_id is None:
+            self.cache.clear()
+        else:
+            self.cache.invalidate(str(device_id))
+
+    @staticmethod
+    def _copy(device: Device) -> Device:
+        # callers mutate the devices they get, cached entries must stay untouched
+        return replace(
+            device,
+            device_fence=(
+                list(device.device_fence) if device.device_fence is not None else None
+            ),
+        )
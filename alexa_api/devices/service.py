@@ -1,11 +1,18 @@
 from dataclasses import dataclass
-from typing import Optional, Iterator, Tuple, Any, Dict, List
+from typing import Optional, Iterable, Iterator, Tuple, Any, Dict, List
+import base64
+import json
 from bson import ObjectId
 from typing_extensions import runtime_checkable, Protocol
 from alexa_api.intents.alexa_data import Device
 from kink import inject
 from alexa_api.devices.repository import IDevicesRepository
-from alexa_api.errors import RecordExists, RecordNotFound
+from alexa_api.errors import BadRequest, RecordNotFound
+from alexa_api.devices import (
+    DB_SCAN_SEGMENTS,
+    DEVICES_PAGE_LIMIT,
+    DEVICES_PAGE_MAX_LIMIT,
+)
 
 
 @dataclass
@@ -100,6 +107,41 @@ class UpdateDeviceRequest:
             yield key, value
 
 
+@dataclass
+class GetDeviceListRequest:
+    limit: Optional[int]
+    start_key: Optional[Dict]
+
+    def __init__(self, limit: Optional[str], next_cursor: Optional[str]) -> None:
+        try:
+            self.limit = int(limit) if limit is not None else None
+            self.start_key = decode_cursor(next_cursor) if next_cursor else None
+        except (ValueError, TypeError, KeyError) as e:
+            raise BadRequest(f"Invalid pagination parameters: {e}") from e
+        if self.limit is not None and not 0 < self.limit <= DEVICES_PAGE_MAX_LIMIT:
+            raise BadRequest(f"limit must be between 1 and {DEVICES_PAGE_MAX_LIMIT}")
+
+    @property
+    def paginated(self) -> bool:
+        return self.limit is not None or self.start_key is not None
+
+
+@dataclass
+class DeviceListPage:
+    devices: Iterable[Device]
+    next_cursor: Optional[str] = None
+
+
+def encode_cursor(start_key: Dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(start_key).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Dict:
+    start_key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    # only a device key is a valid place to resume the scan from
+    return {"device_id": str(ObjectId(start_key["device_id"]))}
+
+
 @dataclass
 class DeleteDeviceRequest:
     device_id: ObjectId
@@ -116,7 +158,7 @@ class IDevicesService(Protocol):
     def get(self, request: GetDeviceRequest) -> Device:
         ...
 
-    def get_list(self) -> Dict:
+    def get_list(self, request: GetDeviceListRequest) -> DeviceListPage:
         ...
 
     def update(self, request: UpdateDeviceRequest) -> Device:
@@ -133,65 +175,47 @@ class DevicesService(IDevicesService):
 
     def create(self, request: CreateDeviceRequest) -> Device:
         device = Device(**dict(request))
-
-        existing_position = self.devices_repository.position_exists(request.position)
-        if existing_position:
-            raise RecordExists(
-                f"this position is already used by device {existing_position}"
-            )
-        existing_gpio = self.devices_repository.position_exists(request.GPIO)
-        if existing_gpio:
-            raise RecordExists(
-                f"this GPIO is already used by device {existing_position}"
-            )
-
-        list(self.devices_repository.get_device_fence_list(request.device_fence))
-
+        # position/GPIO uniqueness and fence existence are enforced by the insert
         self.devices_repository.insert(device)
         return device
 
     def get(self, request: GetDeviceRequest) -> Device:
         return self.devices_repository.get(request.device_id)
 
-    def get_list(self) -> Dict:
-        return {
-            "devices": [dict(device) for device in self.devices_repository.get_list()]
-        }
+    def get_list(self, request: GetDeviceListRequest) -> DeviceListPage:
+        if not request.paginated:
+            # lazily hydrated, so the caller can encode while the scan goes on
+            return DeviceListPage(self.devices_repository.get_list(DB_SCAN_SEGMENTS))
+
+        devices, last_key = self.devices_repository.get_page(
+            request.limit or DEVICES_PAGE_LIMIT, request.start_key
+        )
+        if not devices and request.start_key is None:
+            raise RecordNotFound("No devices yet")
+        return DeviceListPage(devices, encode_cursor(last_key) if last_key else None)
 
     def update(self, request: UpdateDeviceRequest) -> Device:
-        if request.position:
-            existing_position_device = self.devices_repository.position_exists(
-                request.position
-            )
-            if (
-                existing_position_device
-                and existing_position_device != request.device_id
-            ):
-                raise RecordExists(
-                    f"this position is already used by device {existing_position_device}"
-                )
-        if request.GPIO:
-            existing_gpio_device = self.devices_repository.gpio_exists(request.GPIO)
-            if existing_gpio_device and existing_gpio_device != request.device_id:
-                raise RecordExists(
-                    f"this GPIO is already used by device {existing_gpio_device}"
-                )
-
-        actual_device = self.devices_repository.get(request.device_id)
+        actual_device = self.devices_repository.get(request.device_id, consistent=True)
         if not actual_device:
             raise RecordNotFound(f"Device with id {request.device_id} was not found")
 
-        list(self.devices_repository.get_device_fence_list(request.device_fence))
-
         new_device = self._make_device_entity(actual_device, **dict(request))
-        self.devices_repository.update(new_device)
+        if str(request.device_id) in map(str, new_device.device_fence or []):
+            raise BadRequest("A device can't be fenced by itself")
+        actual_record = dict(actual_device)
+        changes = {
+            key: value
+            for key, value in dict(new_device).items()
+            if key not in ("updated_at", "version") and value != actual_record[key]
+        }
+        self.devices_repository.update_fields(
+            request.device_id, changes, actual_device
+        )
+        if changes:
+            new_device.version = actual_device.version + 1
         return new_device
 
     def delete(self, request: DeleteDeviceRequest) -> None:
-        for device in self.devices_repository.get_list():
-            if device.device_fence and request.device_id in device.device_fence:
-                device.device_fence.remove(request.device_id)
-                self.devices_repository.update(device)
         self.devices_repository.delete(request.device_id)
 
     @staticmethod
@@ -24,3 +24,11 @@ class RecordExists(ApiError):
 
 class TimeOut(ApiError):
     status_code = 408
+
+
+class UpdateConflict(ApiError):
+    status_code = 409
+
+
+class BadRequest(ApiError):
+    status_code = 400
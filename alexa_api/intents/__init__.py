@@ -0,0 +1,5 @@
+from os import environ
+
+DIALOGS_REFRESH_INTERVAL = float(environ.get("DIALOGS_REFRESH_INTERVAL", 300))
+# item of the dialogs table whose "version" attribute is bumped on every catalog edit
+DIALOGS_VERSION_ID = environ.get("DIALOGS_VERSION_ID", "catalog_version")
@@ -1,9 +1,75 @@
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
+from decimal import Decimal
+from functools import lru_cache
 from bson import ObjectId
-from typing import Optional, Iterator, Tuple, Any, Generator, List
+from typing import Optional, Iterable, Iterator, Tuple, Any, Callable, Dict, List
 from datetime import datetime
+import json
 
 
+def slotted(cls: type) -> type:
+    """Rebuild a dataclass with __slots__ (dataclass(slots=True) needs python 3.10)"""
+    names = tuple(f.name for f in fields(cls))
+    namespace = {
+        key: value
+        for key, value in cls.__dict__.items()
+        if key not in names and key not in ("__dict__", "__weakref__")
+    }
+    namespace["__slots__"] = names
+    return type(cls)(cls.__name__, cls.__bases__, namespace)
+
+
+@lru_cache(maxsize=4096)
+def object_id(value: str) -> ObjectId:
+    # fence lists repeat the same few ids across the whole fleet
+    return ObjectId(value)
+
+
+def _timestamp(value: Any) -> int:
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    return int(value)
+
+
+def _datetime(value: Any) -> datetime:
+    # inverse of _timestamp, so a stored updated_at reads back unchanged
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromtimestamp(int(value))
+
+
+def _ids_to_str(value: List[ObjectId]) -> List[str]:
+    return [str(element) for element in value]
+
+
+def _ids_from_str(value: Optional[List[str]]) -> Optional[List[ObjectId]]:
+    if not value:
+        return None
+    return [object_id(str(element)) for element in value]
+
+
+# (field, converter) pairs resolved once instead of branching on every key
+Converters = Tuple[Tuple[str, Optional[Callable[[Any], Any]]], ...]
+
+
+def _converters(cls: type, converters: Dict[str, Callable[[Any], Any]]) -> Converters:
+    return tuple((f.name, converters.get(f.name)) for f in fields(cls))
+
+
+def _convert(model: Any, converters: Converters, skip_none: bool) -> Dict[str, Any]:
+    record: Dict[str, Any] = {}
+    for name, convert in converters:
+        value = getattr(model, name)
+        if value is None:
+            if skip_none:
+                continue
+        elif convert is not None:
+            value = convert(value)
+        record[name] = value
+    return record
+
+
+@slotted
 @dataclass
 class Dialog:
 
@@ -16,7 +82,27 @@ class Dialog:
     locale: Optional[str]
     description: Optional[str]
 
+    def __iter__(self) -> Iterator[Tuple[str, Any]]:
+        return iter(_convert(self, _DIALOG_CONVERTERS, skip_none=False).items())
+
+    def to_item(self) -> Dict[str, Any]:
+        return _convert(self, _DIALOG_CONVERTERS, skip_none=True)
 
+    @classmethod
+    def from_item(cls, item: Dict) -> "Dialog":
+        return cls(
+            id=item["id"],
+            intent_id=item["intent_id"],
+            speak=item["speak"],
+            ask=item.get("ask"),
+            iot_err=int(item["iot_err"]),
+            device_id=object_id(item["device_id"]),
+            locale=item.get("locale"),
+            description=item.get("description"),
+        )
+
+
+@slotted
 @dataclass
 class Device:
 
@@ -30,26 +116,67 @@ class Device:
     updated_at: datetime = field(default_factory=datetime.utcnow)
     weather_fence: Optional[int] = 0
     timer_fence: Optional[int] = 0
+    # bumped by every write, the optimistic lock of read-modify-write updates
+    version: int = 0
 
     def __iter__(self) -> Iterator[Tuple[str, Any]]:
-        for key, value in self.__dict__.items():
-            if key == "device_id":
-                value = str(self.device_id)
-            if key == "updated_at":
-                value = int(datetime.utcnow().timestamp())
-            if key == "device_fence" and self.device_fence:
-                value = [str(element) for element in value]
-            yield key, value
-
-    def serialize(self) -> Generator[Tuple[str, Any], None, None]:
-        device_properties = {
-            key: value for key, value in self.__dict__.items() if value is not None
-        }
-        for key, value in device_properties.items():
-            if key == "device_id":
-                value = str(self.device_id)
-            if key == "updated_at":
-                value = int(datetime.utcnow().timestamp())
-            if key == "device_fence":
-                value = [str(element) for element in value]
-            yield key, value
+        return iter(_convert(self, _DEVICE_CONVERTERS, skip_none=False).items())
+
+    def to_item(self) -> Dict[str, Any]:
+        return _convert(self, _DEVICE_CONVERTERS, skip_none=True)
+
+    @classmethod
+    def from_item(cls, item: Dict) -> "Device":
+        return cls(
+            device_id=object_id(item["device_id"]),
+            name=item["name"],
+            description=item.get("description"),
+            position=int(item["position"]),
+            GPIO=int(item["GPIO"]),
+            status=item.get("status"),
+            weather_fence=int(item.get("weather_fence", 0)),
+            timer_fence=int(item.get("timer_fence", 0)),
+            device_fence=_ids_from_str(item.get("device_fence")),
+            updated_at=_datetime(item["updated_at"])
+            if "updated_at" in item
+            else datetime.utcnow(),
+            version=int(item.get("version", 0)),
+        )
+
+
+_DIALOG_CONVERTERS = _converters(Dialog, {"id": str, "device_id": str, "iot_err": int})
+_DEVICE_CONVERTERS = _converters(
+    Device,
+    {"device_id": str, "device_fence": _ids_to_str, "updated_at": _timestamp},
+)
+
+
+class ModelEncoder(json.JSONEncoder):
+    """JSON encoder for API responses carrying models or raw DynamoDB values"""
+
+    def default(self, o: Any) -> Any:
+        if isinstance(o, (Device, Dialog)):
+            return dict(o)
+        if isinstance(o, ObjectId):
+            return str(o)
+        if isinstance(o, Decimal):
+            return int(o) if o == o.to_integral_value() else float(o)
+        if isinstance(o, datetime):
+            return _timestamp(o)
+        return super().default(o)
+
+
+def iter_json_list(
+    key: str, records: Iterable[Any], **extra: Any
+) -> Iterator[str]:
+    """Encode {key: [records...], **extra} chunk by chunk as records arrive"""
+    encoder = ModelEncoder()
+    yield "{" + encoder.encode(key) + ": ["
+    for index, record in enumerate(records):
+        if index:
+            yield ", "
+        yield from encoder.iterencode(record)
+    yield "]"
+    for name, value in extra.items():
+        yield ", " + encoder.encode(name) + ": " + encoder.encode(value)
+    yield "}"
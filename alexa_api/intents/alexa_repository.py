@@ -6,6 +6,7 @@ from alexa_api.errors import AlexaRepositoryError
 from alexa_api.intents.alexa_data import Dialog
 from bson import ObjectId
 from alexa_api.iot.service import SendOrderRequest, IIotService
+from alexa_api.intents.dialog_catalog import DialogCatalog
 
 
 @runtime_checkable
@@ -22,11 +23,19 @@ class IAlexaRepository(Protocol):
 
 @inject(alias=IAlexaRepository)
 class AlexaRepository(IAlexaRepository):
-    def __init__(self, dialogs_table: Any, iot_service: IIotService):
+    def __init__(
+        self, dialogs_table: Any, iot_service: IIotService, dialog_catalog: DialogCatalog
+    ):
         self.table = dialogs_table
         self.iot_service = iot_service
+        self.dialog_catalog = dialog_catalog
 
     def get_dialog(self, intent_name: str, iot_err: int = 0, locale: str = "es-ES") -> Dialog:
+        item = self.dialog_catalog.get_dialog(intent_name, iot_err, locale)
+        if item:
+            return self._hydrate_record(item)
+
+        # not in the catalog yet, ask the table
         condition = conditions.Key("intent_id").eq(intent_name) & conditions.Key("iot_err").eq(iot_err)
         result = self.table.query(
             IndexName="by_intent_id_and_iot_err", KeyConditionExpression=condition
@@ -43,6 +52,10 @@ class AlexaRepository(IAlexaRepository):
         return self._hydrate_record(result["Items"][0])
 
     def get_device_id(self, intent_name: str) -> ObjectId:
+        device_id = self.dialog_catalog.get_device_id(intent_name)
+        if device_id:
+            return ObjectId(device_id)
+
         condition = conditions.Key("intent_id").eq(str(intent_name))
         result = self.table.query(
             IndexName="by_intent_id", KeyConditionExpression=condition
@@ -58,13 +71,4 @@ class AlexaRepository(IAlexaRepository):
 
     @staticmethod
     def _hydrate_record(item: Dict) -> Dialog:
-        return Dialog(
-            id=item["id"],
-            intent_id=item["intent_id"],
-            speak=item["speak"],
-            ask=item.get("ask"),
-            iot_err=int(item["iot_err"]),
-            device_id=ObjectId(item["device_id"]),
-            locale=item.get("locale"),
-            description=item.get("description")
-        )
+        return Dialog.from_item(item)
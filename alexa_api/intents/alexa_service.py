@@ -1,10 +1,17 @@
 import logging
+from typing import Dict, Optional, Tuple
 import ask_sdk_core.utils as ask_utils
 from ask_sdk_core.utils.request_util import get_locale
 
 from ask_sdk_core.dispatch_components import AbstractRequestHandler
 from ask_sdk_core.dispatch_components import AbstractExceptionHandler
 from ask_sdk_core.handler_input import HandlerInput
+from ask_sdk_core.skill import CustomSkill
+from ask_sdk_core.skill_builder import SkillBuilder
+from ask_sdk_runtime.dispatch_components.request_components import (
+    GenericRequestHandlerChain,
+    GenericRequestMapper,
+)
 
 from ask_sdk_model import Response
 from alexa_api.intents.alexa_repository import AlexaRepository
@@ -14,6 +21,8 @@ logger.setLevel(logging.INFO)
 
 
 class LaunchRequestHandler(AbstractRequestHandler):
+    request_types = ("LaunchRequest",)
+
     def __init__(self, alexa_repository: AlexaRepository) -> None:
         self.alexa_repository = alexa_repository
 
@@ -32,6 +41,8 @@ class LaunchRequestHandler(AbstractRequestHandler):
 
 
 class EnciendePiscinaIntent(AbstractRequestHandler):
+    intent_names = ("EnciendePiscinaIntent",)
+
     def __init__(self, alexa_repository: AlexaRepository) -> None:
         self.alexa_repository = alexa_repository
 
@@ -60,6 +71,8 @@ class EnciendePiscinaIntent(AbstractRequestHandler):
 
 
 class ApagaPiscinaIntent(AbstractRequestHandler):
+    intent_names = ("ApagaPiscinaIntent",)
+
     def __init__(self, alexa_repository: AlexaRepository) -> None:
         self.alexa_repository = alexa_repository
 
@@ -83,6 +96,8 @@ class ApagaPiscinaIntent(AbstractRequestHandler):
 
 
 class HelpIntentHandler(AbstractRequestHandler):
+    intent_names = ("AMAZON.HelpIntent",)
+
     def __init__(self, alexa_repository: AlexaRepository) -> None:
         self.alexa_repository = alexa_repository
 
@@ -101,6 +116,8 @@ class HelpIntentHandler(AbstractRequestHandler):
 
 
 class CancelOrStopIntentHandler(AbstractRequestHandler):
+    intent_names = ("AMAZON.CancelIntent", "AMAZON.StopIntent")
+
     def __init__(self, alexa_repository: AlexaRepository) -> None:
         self.alexa_repository = alexa_repository
 
@@ -121,6 +138,8 @@ class CancelOrStopIntentHandler(AbstractRequestHandler):
 class SessionEndedRequestHandler(AbstractRequestHandler):
     """Handler for Session End."""
 
+    request_types = ("SessionEndedRequest",)
+
     def can_handle(self, handler_input: HandlerInput) -> bool:
 
         return ask_utils.is_request_type("SessionEndedRequest")(handler_input)
@@ -133,6 +152,8 @@ class SessionEndedRequestHandler(AbstractRequestHandler):
 
 
 class IntentReflectorHandler(AbstractRequestHandler):
+    request_types = ("IntentRequest",)
+
     def __init__(self, alexa_repository: AlexaRepository) -> None:
         self.alexa_repository = alexa_repository
 
@@ -175,3 +196,61 @@ class CatchAllExceptionHandler(AbstractExceptionHandler):
         return (
             handler_input.response_builder.speak(dialog.speak).ask(dialog.ask).response
         )
+
+
+class IndexedRequestMapper(GenericRequestMapper):
+    """Finds the handler chain with a dictionary lookup on the request type and
+    intent name, declared by each handler in `request_types` / `intent_names`.
+    Handlers without routes are still found through the `can_handle` chain.
+    """
+
+    def __init__(self, request_handler_chains):
+        super(IndexedRequestMapper, self).__init__(request_handler_chains)
+        self.routes: Dict[Tuple[str, Optional[str]], GenericRequestHandlerChain] = {}
+        # first registered handler wins, as in the can_handle chain
+        for chain in self.request_handler_chains:
+            handler = chain.request_handler
+            for intent_name in getattr(handler, "intent_names", ()):
+                self.routes.setdefault(("IntentRequest", intent_name), chain)
+            for request_type in getattr(handler, "request_types", ()):
+                self.routes.setdefault((request_type, None), chain)
+
+    def get_request_handler_chain(self, handler_input):
+        request = handler_input.request_envelope.request
+        request_type = request.object_type
+        intent_name = request.intent.name if request_type == "IntentRequest" else None
+
+        chain = self.routes.get((request_type, intent_name)) or self.routes.get(
+            (request_type, None)
+        )
+        if chain:
+            return chain
+        return super(IndexedRequestMapper, self).get_request_handler_chain(
+            handler_input
+        )
+
+
+def build_skill(alexa_repository: AlexaRepository) -> CustomSkill:
+    sb = SkillBuilder()
+
+    sb.add_request_handler(LaunchRequestHandler(alexa_repository))
+    sb.add_request_handler(EnciendePiscinaIntent(alexa_repository))
+    sb.add_request_handler(ApagaPiscinaIntent(alexa_repository))
+    sb.add_request_handler(HelpIntentHandler(alexa_repository))
+    sb.add_request_handler(CancelOrStopIntentHandler(alexa_repository))
+    sb.add_request_handler(SessionEndedRequestHandler())
+    sb.add_request_handler(IntentReflectorHandler(alexa_repository))
+
+    sb.add_exception_handler(CatchAllExceptionHandler(alexa_repository))
+
+    skill_configuration = sb.skill_configuration
+    skill_configuration.request_mappers = [
+        IndexedRequestMapper(
+            [
+                chain
+                for mapper in skill_configuration.request_mappers
+                for chain in mapper.request_handler_chains
+            ]
+        )
+    ]
+    return CustomSkill(skill_configuration=skill_configuration)
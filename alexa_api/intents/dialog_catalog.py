@@ -0,0 +1,81 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from kink import inject
+
+from alexa_api.errors import AlexaRepositoryError
+from alexa_api.intents import DIALOGS_REFRESH_INTERVAL, DIALOGS_VERSION_ID
+
+
+@inject
+class DialogCatalog:
+    """In-memory copy of the dialogs table, loaded once per container.
+
+    Dialogs are indexed by (intent_id, iot_err) and then by locale. Every
+    DIALOGS_REFRESH_INTERVAL seconds the version item is read; the catalog is
+    only scanned again when its version changed, or on every interval if the
+    table has no version item.
+    """
+
+    def __init__(self, dialogs_table: Any):
+        self.table = dialogs_table
+        self.version: Optional[Any] = None
+        self.checked_at = float("-inf")
+        self._dialogs: Dict[Tuple[str, int], List[Dict]] = {}
+        self._device_ids: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def get_dialog(self, intent_id: str, iot_err: int, locale: str) -> Optional[Dict]:
+        self._refresh()
+        items = self._dialogs.get((intent_id, int(iot_err)))
+        if not items:
+            return None
+        for item in items:
+            if item.get("locale") == locale:
+                return item
+        return items[0]
+
+    def get_device_id(self, intent_id: str) -> Optional[str]:
+        self._refresh()
+        return self._device_ids.get(intent_id)
+
+    def _refresh(self) -> None:
+        if time.monotonic() - self.checked_at < DIALOGS_REFRESH_INTERVAL:
+            return
+        with self._lock:
+            if time.monotonic() - self.checked_at < DIALOGS_REFRESH_INTERVAL:
+                return
+            version = self._read_version()
+            if version is None or version != self.version or not self._dialogs:
+                self._load()
+            self.version = version
+            self.checked_at = time.monotonic()
+
+    def _read_version(self) -> Optional[Any]:
+        result = self.table.get_item(Key={"id": DIALOGS_VERSION_ID})
+        return result.get("Item", {}).get("version")
+
+    def _load(self) -> None:
+        dialogs: Dict[Tuple[str, int], List[Dict]] = {}
+        device_ids: Dict[str, str] = {}
+        scan_kwargs: Dict[str, Any] = {}
+        while True:
+            result = self.table.scan(**scan_kwargs)
+            if result["ResponseMetadata"]["HTTPStatusCode"] not in range(200, 300):
+                raise AlexaRepositoryError("error occurred when loading dialogs")
+
+            for item in result["Items"]:
+                if "intent_id" not in item:
+                    continue
+                key = (item["intent_id"], int(item["iot_err"]))
+                dialogs.setdefault(key, []).append(item)
+                if "device_id" in item:
+                    device_ids.setdefault(item["intent_id"], item["device_id"])
+
+            if "LastEvaluatedKey" not in result:
+                break
+            scan_kwargs["ExclusiveStartKey"] = result["LastEvaluatedKey"]
+
+        self._dialogs = dialogs
+        self._device_ids = device_ids
@@ -9,3 +9,17 @@ OW_LAT = environ.get("OW_LAT", "")
 OW_LON = environ.get("OW_LON", "")
 TIMER_FENCE_ARN = environ.get("TIMER_FENCE_ARN", "")
 SNS_ARN = environ.get("SNS_ARN", "")
+OW_CONNECT_TIMEOUT = float(environ.get("OW_CONNECT_TIMEOUT", 1))
+OW_READ_TIMEOUT = float(environ.get("OW_READ_TIMEOUT", 2))
+OW_CACHE_TTL = float(environ.get("OW_CACHE_TTL", 600))
+# an expired observation is still served for this long while it is refreshed
+OW_STALE_TTL = float(environ.get("OW_STALE_TTL", 1800))
+# how often the client certificates bucket is checked for changes
+CONFIG_REFRESH_INTERVAL = float(environ.get("CONFIG_REFRESH_INTERVAL", 300))
+# threads running the blocking calls of concurrent order checks
+ORDER_IO_WORKERS = int(environ.get("ORDER_IO_WORKERS", 4))
+# devices a single group order may switch
+GROUP_ORDER_MAX_DEVICES = int(environ.get("GROUP_ORDER_MAX_DEVICES", 25))
+# seconds between MQTT pings; an idle connection older than this is made again,
+# the broker closes it at 1.5 times the interval without a ping
+IOT_KEEP_ALIVE = int(environ.get("IOT_KEEP_ALIVE", 600))
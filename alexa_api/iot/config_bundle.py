@@ -0,0 +1,105 @@
+import hashlib
+import json
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from kink import inject
+
+from alexa_api import S3_CLIENT_CERTIFICATES, IOT_ENDPOINT, IOT_PORT
+from alexa_api.aws import AwsClients
+from alexa_api.iot import (
+    BASE_TOPIC,
+    CONFIG_REFRESH_INTERVAL,
+    DESIRED_TOPIC,
+    REPORTED_TOPIC,
+)
+
+# (json body, etag)
+Bundle = Tuple[str, str]
+
+
+@inject
+class ConfigBundle:
+    """Device config payload built from the client certificates bucket.
+
+    The bucket is listed at most every CONFIG_REFRESH_INTERVAL seconds, in the
+    background once a bundle exists, and objects are only downloaded again
+    when their ETag changes. The bundle ETag is derived from the object ETags,
+    so clients holding the current one can skip the body altogether.
+    """
+
+    def __init__(self, aws_clients: AwsClients) -> None:
+        self.aws_clients = aws_clients
+        self._objects: Dict[str, Tuple[str, str]] = {}  # key -> (etag, body)
+        self._bundle: Optional[Bundle] = None
+        self._checked_at = float("-inf")
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def get(self) -> Bundle:
+        with self._lock:
+            bundle = self._bundle
+            expired = time.monotonic() - self._checked_at >= CONFIG_REFRESH_INTERVAL
+            if bundle and expired and not self._refreshing:
+                self._refreshing = True
+                threading.Thread(target=self._refresh, daemon=True).start()
+        if bundle:
+            return bundle
+
+        with self._load_lock:
+            return self._bundle or self._load()
+
+    def _refresh(self) -> None:
+        try:
+            with self._load_lock:
+                self._load()
+        except Exception as e:
+            # keep serving the current bundle, the next request retries
+            print("Config refresh failed:", e)
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _load(self) -> Bundle:
+        s3 = self.aws_clients.client("s3")
+        listing: Dict[str, str] = {}
+        for page in s3.get_paginator("list_objects_v2").paginate(
+            Bucket=S3_CLIENT_CERTIFICATES
+        ):
+            for obj in page.get("Contents", []):
+                listing[obj["Key"]] = obj["ETag"]
+
+        settings = {
+            "endpoint": IOT_ENDPOINT,
+            "port": IOT_PORT,
+            "desired": DESIRED_TOPIC,
+            "reported": REPORTED_TOPIC,
+            "base": BASE_TOPIC,
+        }
+        fingerprint = json.dumps([sorted(listing.items()), settings], sort_keys=True)
+        etag = '"' + hashlib.sha256(fingerprint.encode("utf-8")).hexdigest() + '"'
+        if self._bundle and self._bundle[1] == etag:
+            self._checked_at = time.monotonic()
+            return self._bundle
+
+        objects = {}
+        for key, object_etag in listing.items():
+            cached = self._objects.get(key)
+            if cached and cached[0] == object_etag:
+                objects[key] = cached
+            else:
+                body = s3.get_object(Bucket=S3_CLIENT_CERTIFICATES, Key=key)["Body"]
+                objects[key] = (object_etag, body.read().decode("utf-8"))
+
+        payload: Dict[str, Any] = {
+            "certificates": {key: obj[1] for key, obj in objects.items()},
+            **settings,
+        }
+        bundle = (json.dumps(payload), etag)
+        with self._lock:
+            self._objects = objects
+            self._bundle = bundle
+            self._checked_at = time.monotonic()
+        return bundle
@@ -0,0 +1,116 @@
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Set
+
+from AWSIoTPythonSDK.exception.AWSIoTExceptions import connectTimeoutException
+from kink import inject
+
+from alexa_api.iot import IOT_KEEP_ALIVE
+from alexa_api.metrics import span
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+CONNECT_ATTEMPTS = 3
+BACKOFF_BASE = 0.5  # seconds, doubled on every failed attempt
+
+
+@inject
+class IotConnection:
+    """Keeps a single MQTT connection alive across warm invocations.
+
+    The connection is only (re)established when the client is offline, and
+    every topic is subscribed once per connection; the SDK resubscribes by
+    itself after an automatic reconnect. A frozen container can't see its
+    socket drop, so a connection idle for longer than the keep alive interval,
+    after which the broker closes it, is made again instead of reused.
+    """
+
+    def __init__(self, iot_provider: Callable[[], Any]):
+        # the client is built on the first connect, handlers that never publish
+        # don't download the certificates
+        self.iot_provider = iot_provider
+        self.iot: Optional[Any] = None
+        self.online = False
+        self.last_used = float("-inf")
+        self.subscriptions: Set[str] = set()
+        self.metrics: Dict[str, float] = {
+            "connects": 0,
+            "reuses": 0,
+            "expired": 0,
+            "failures": 0,
+            "last_handshake_ms": 0.0,
+        }
+        self._lock = threading.Lock()
+
+    def connect(self) -> Any:
+        with self._lock:
+            iot = self.iot
+            if iot is None:
+                iot = self.iot = self.iot_provider()
+                # callbacks are loaded by the SDK on connect, so set them first
+                iot.onOnline = self._on_online
+                iot.onOffline = self._on_offline
+
+            if self.online and time.monotonic() - self.last_used < IOT_KEEP_ALIVE:
+                # only counted, the next handshake report carries the total
+                self.metrics["reuses"] += 1
+                self.last_used = time.monotonic()
+                return iot
+            if self.online:
+                self._disconnect(iot)
+
+            for attempt in range(CONNECT_ATTEMPTS):
+                started = time.perf_counter()
+                try:
+                    with span("mqtt", "connect"):
+                        iot.connect(IOT_KEEP_ALIVE)
+                except connectTimeoutException:
+                    self.metrics["failures"] += 1
+                    if attempt == CONNECT_ATTEMPTS - 1:
+                        raise
+                    time.sleep(BACKOFF_BASE * 2 ** attempt)
+                    continue
+
+                self.online = True
+                self.last_used = time.monotonic()
+                self.subscriptions.clear()
+                self.metrics["connects"] += 1
+                self.metrics["last_handshake_ms"] = (
+                    time.perf_counter() - started
+                ) * 1000
+                self._report("connected")
+                return iot
+
+    def publish(self, topic: str, payload: str, qos: int) -> None:
+        iot = self.connect()
+        with span("mqtt", "publish"):
+            iot.publish(topic, payload, qos)
+
+    def subscribe(self, topic: str, qos: int, callback: Callable) -> None:
+        iot = self.connect()
+        if topic in self.subscriptions:
+            return
+        with span("mqtt", "subscribe"):
+            iot.subscribe(topic, qos, callback)
+        self.subscriptions.add(topic)
+
+    def _disconnect(self, iot: Any) -> None:
+        self.online = False
+        self.metrics["expired"] += 1
+        try:
+            iot.disconnect()
+        except Exception as e:
+            # the broker has most likely closed it already
+            logger.info(json.dumps({"iot_connection": "disconnect failed", "error": str(e)}))
+
+    def _on_online(self) -> None:
+        self.online = True
+
+    def _on_offline(self) -> None:
+        self.online = False
+
+    def _report(self, event: str) -> None:
+        logger.info(json.dumps({"iot_connection": event, **self.metrics}))
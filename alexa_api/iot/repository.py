@@ -1,25 +1,29 @@
 from typing_extensions import Protocol, runtime_checkable
-from typing import Dict, Any
-import boto3
+from typing import Dict, Optional, List, Tuple
 import json
 from kink import inject
 import time
 from bson import ObjectId
-from alexa_api.devices.repository import Device, DevicesRepository
+from alexa_api.devices.repository import Device, IDevicesRepository
 from alexa_api.iot.iot import IotErr
+from alexa_api.iot.connection import IotConnection
+from alexa_api.iot.waiters import ReportedWaiters
+from alexa_api.iot.timers import TimerRegistry
+from alexa_api.iot.weather import WeatherProvider
+from alexa_api.aws import AwsClients
+from alexa_api.errors import AWSError
 from datetime import datetime
 from alexa_api.iot import (
     REPORTED_TOPIC,
     DESIRED_TOPIC,
-    OW_ENDPOINT,
-    OW_APPID,
     OW_LAT,
     OW_LON,
     TIMER_FENCE_ARN,
     SNS_ARN
 )
 import re
-import requests
+
+SNS_BATCH_LIMIT = 10
 
 
 @runtime_checkable
@@ -30,118 +34,226 @@ class IIotRepository(Protocol):
     ) -> None:
         ...
 
+    def dispatch_sns_batch(
+        self, events: List[Tuple[str, bool, ObjectId, Dict]]
+    ) -> None:
+        ...
+
     def send_order(self, device_id: ObjectId, status: bool) -> None:
         ...
 
-    def get_device_status(self, device_id: ObjectId) -> bool:
+    def send_orders(self, orders: Dict[ObjectId, bool]) -> None:
         ...
 
     def confirm_status(
-        self, device: Device, desired_status: bool, timeout: int
+        self, device: Device, desired_status: bool, timeout: float
     ) -> Dict:
         ...
 
+    def confirm_statuses(
+        self, orders: List[Tuple[Device, bool]], timeout: float
+    ) -> Dict[str, Dict]:
+        ...
+
     def start_timer_fence(self, event: Dict, device_id: str, timer: int) -> None:
         ...
 
     def weather_fence(self, humidity: int) -> bool:
         ...
 
-    def wait_reported(self, device_id: str, status: bool) -> bool:
+    def wait_reported(self, device_id: str, status: bool, timeout: float = 25) -> bool:
         ...
 
     def iot_subscribe(self) -> None:
         ...
 
+    def listen_reported(self) -> bool:
+        ...
+
 
 @inject(alias=IIotRepository)
 class IotRepository(IIotRepository):
-    def __init__(self, iot: Any, devices_repository: DevicesRepository):
-        self.iot = iot
+    def __init__(
+        self,
+        iot_connection: IotConnection,
+        devices_repository: IDevicesRepository,
+        weather_provider: WeatherProvider,
+        aws_clients: AwsClients,
+        timer_registry: TimerRegistry,
+    ):
+        self.iot_connection = iot_connection
         self.devices_repository = devices_repository
-        self.message_arrived = None
+        self.weather_provider = weather_provider
+        self.aws_clients = aws_clients
+        self.timer_registry = timer_registry
+        self.reports_available: Optional[bool] = None
+        self.waiters = ReportedWaiters()
+        self._ordered_at: Dict[str, float] = {}
 
     def dispatch_sns(
         self, action: str, status: bool, device_id: ObjectId, event: Dict
     ) -> None:
         print("Me ha llegado un IoT")
-        client = boto3.client("sns")
+        client = self.aws_clients.client("sns")
         arn = SNS_ARN
-        message_attributes = {
-            "action": {"DataType": "String", "StringValue": action},
-            "status": {"DataType": "String", "StringValue": str(status)},
-            "device_id": {"DataType": "String", "StringValue": str(device_id)},
-        }
         client.publish(
-            TopicArn=arn,
-            Message=json.dumps({"default": json.dumps(event)}),
-            MessageStructure="json",
-            MessageAttributes=message_attributes,
+            TopicArn=arn, **self._sns_message(action, status, device_id, event)
         )
         print("Envio un SNS")
 
+    def dispatch_sns_batch(
+        self, events: List[Tuple[str, bool, ObjectId, Dict]]
+    ) -> None:
+        client = self.aws_clients.client("sns")
+        for start in range(0, len(events), SNS_BATCH_LIMIT):
+            entries = [
+                {"Id": str(index), **self._sns_message(*event)}
+                for index, event in enumerate(events[start : start + SNS_BATCH_LIMIT])
+            ]
+            result = client.publish_batch(
+                TopicArn=SNS_ARN, PublishBatchRequestEntries=entries
+            )
+            if result.get("Failed"):
+                # the whole batch is retried by the event source
+                raise AWSError(
+                    f"AWS error {result['Failed'][0]['Code']} publishing "
+                    f"{len(result['Failed'])} IoT events"
+                )
+
+    @staticmethod
+    def _sns_message(
+        action: str, status: bool, device_id: ObjectId, event: Dict
+    ) -> Dict:
+        return {
+            "Message": json.dumps({"default": json.dumps(event)}),
+            "MessageStructure": "json",
+            "MessageAttributes": {
+                "action": {"DataType": "String", "StringValue": action},
+                "status": {"DataType": "String", "StringValue": str(status)},
+                "device_id": {"DataType": "String", "StringValue": str(device_id)},
+            },
+        }
+
     def send_order(self, device_id: ObjectId, status: bool) -> None:
         payload = {"state": {"desired": {"is_on": status, "device_id": str(device_id)}}}
-        self.iot.connect()
-        self.iot.publish(DESIRED_TOPIC, json.dumps(payload), 1)
+        # reports older than the order don't confirm it
+        self._ordered_at[str(device_id)] = time.monotonic()
+        self.iot_connection.publish(DESIRED_TOPIC, json.dumps(payload), 1)
+
+    def send_orders(self, orders: Dict[ObjectId, bool]) -> None:
+        # every order goes out on the same MQTT connection
+        for device_id, status in orders.items():
+            self.send_order(device_id, status)
 
     def confirm_status(
-        self, current_device: Device, desired_status: bool, timeout: int = 25
+        self, current_device: Device, desired_status: bool, timeout: float = 25
     ) -> Dict:
-        max_time = time.time() + timeout
-        while time.time() < max_time:
-            time.sleep(2)
-            device = self.devices_repository.get(current_device.device_id)
-            if device.status == desired_status:
-                return {"info": "Device status confirmed", "err": IotErr.CONFIRMED}
+        if self.reports_available is None:
+            self.listen_reported()
+
+        if self.reports_available:
+            confirmed = self.wait_reported(
+                str(current_device.device_id), desired_status, timeout
+            )
+        else:
+            confirmed = self._poll_status(current_device, desired_status, timeout)
 
+        return self._confirmation(confirmed)
+
+    def confirm_statuses(
+        self, orders: List[Tuple[Device, bool]], timeout: float
+    ) -> Dict[str, Dict]:
+        if self.reports_available is None:
+            self.listen_reported()
+
+        # reports are kept as they arrive, so waiting for the devices in turn
+        # against one deadline lasts as long as the slowest confirmation
+        deadline = time.monotonic() + timeout
+        confirmations = {}
+        for device, desired_status in orders:
+            remaining = max(deadline - time.monotonic(), 0)
+            if self.reports_available:
+                confirmed = self.wait_reported(
+                    str(device.device_id), desired_status, remaining
+                )
+            else:
+                confirmed = self._poll_status(device, desired_status, remaining)
+            confirmations[str(device.device_id)] = self._confirmation(confirmed)
+        return confirmations
+
+    @staticmethod
+    def _confirmation(confirmed: bool) -> Dict:
+        if confirmed:
+            return {"info": "Device status confirmed", "err": IotErr.CONFIRMED}
         return {"info": "Device status confirmation failed", "err": IotErr.FAILED}
 
     def start_timer_fence(self, event: Dict, device_id: str, timer: int) -> None:
 
-        state_machine = boto3.client("stepfunctions")
+        state_machine = self.aws_clients.client("stepfunctions")
         state_machine_name = self._get_machine_name(device_id)
         input_event = {**event, **{"delay": timer, "name": state_machine_name}}
 
-        state_machine.start_execution(
-            stateMachineArn=TIMER_FENCE_ARN,
-            input=json.dumps(input_event),
-            name=state_machine_name,
-        )
+        # registered first, so the timer being replaced can't stop the device
+        previous = self.timer_registry.register(device_id, state_machine_name)
+        try:
+            state_machine.start_execution(
+                stateMachineArn=TIMER_FENCE_ARN,
+                input=json.dumps(input_event),
+                name=state_machine_name,
+            )
+        except Exception:
+            if previous:
+                self.timer_registry.register(device_id, previous)
+            else:
+                self.timer_registry.release(device_id, state_machine_name)
+            raise
 
     def weather_fence(self, humidity: int) -> bool:
-        payload = (("lat", OW_LAT), ("lon", OW_LON), ("appid", OW_APPID))
-        response = requests.get(OW_ENDPOINT, params=payload)
-        if response.status_code not in range(200, 300):
+        current_humidity = self.weather_provider.humidity(OW_LAT, OW_LON)
+        if current_humidity is None:
             return False
-        result = json.loads(response.text)
-        if result["main"]["humidity"] > humidity:
-            return True
-        return False
+        return current_humidity > humidity
 
     def iot_subscribe(self) -> None:
-        self.iot.onMessage = self._reported_callback
-        self.iot.subscribe(REPORTED_TOPIC, 1, None)
-        self.iot.connect()
-
-    def wait_reported(self, device_id: str, status: bool) -> bool:
-        timeout = time.time() + 25
-        while time.time() < timeout:
-            # device_id should match and the switch should be off
-            if self.message_arrived:
-                if self.message_arrived["state"]["reported"]["device_id"] == device_id:
-                    if self.message_arrived["state"]["reported"]["is_on"] != status:
-                        self.message_arrived = None
-                    else:
-                        return True
-                else:
-                    self.message_arrived = None
-            time.sleep(1)
-
-        return False
-
-    def _reported_callback(self, message):
-        self.message_arrived = json.loads(message.payload.decode("utf-8"))
+        self.iot_connection.subscribe(REPORTED_TOPIC, 1, self._reported_callback)
+
+    def listen_reported(self) -> bool:
+        # subscribe before publishing so the device report can't be missed
+        try:
+            self.iot_subscribe()
+            self.reports_available = True
+        except Exception as e:
+            print("Reported topic unavailable, falling back to polling:", e)
+            self.reports_available = False
+        return self.reports_available
+
+    def wait_reported(self, device_id: str, status: bool, timeout: float = 25) -> bool:
+        since = self._ordered_at.get(device_id, time.monotonic())
+        return self.waiters.wait(device_id, status, timeout, since)
+
+    def _reported_callback(self, client, userdata, message):
+        event = json.loads(message.payload.decode("utf-8"))
+        if "reported" not in event.get("state", {}):
+            return
+        reported = event["state"]["reported"]
+        self.devices_repository.invalidate(ObjectId(reported["device_id"]))
+        self.waiters.resolve(reported["device_id"], reported["is_on"])
+
+    def _poll_status(
+        self, current_device: Device, desired_status: bool, timeout: float
+    ) -> bool:
+        max_time = time.time() + timeout
+        delay = 0.25
+        while True:
+            time.sleep(min(delay, max(max_time - time.time(), 0)))
+            device = self.devices_repository.get(
+                current_device.device_id, consistent=True
+            )
+            if device.status == desired_status:
+                return True
+            if time.time() >= max_time:
+                return False
+            delay = min(delay * 2, 4)
 
     @staticmethod
     def _get_machine_name(device_id: str) -> str:
@@ -1,15 +1,21 @@
 from typing_extensions import Protocol, runtime_checkable
-from typing import Dict, Optional
+from typing import Any, Awaitable, Callable, Dict, Optional, List, Set, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import base64
+import functools
+import json
+import time
 from kink import inject
 from dataclasses import dataclass
 from bson import ObjectId
 from alexa_api.iot.repository import IotRepository
-from alexa_api.devices.repository import DevicesRepository
-from alexa_api.errors import RecordNotFound
+from alexa_api.devices.repository import Device, IDevicesRepository
+from alexa_api.errors import BadRequest, RecordNotFound
 from alexa_api.iot.iot import IotErr, StateMachineErr
-import boto3
-from alexa_api.iot import TIMER_FENCE_ARN, DESIRED_TOPIC, REPORTED_TOPIC, BASE_TOPIC
-from alexa_api import S3_CLIENT_CERTIFICATES, IOT_ENDPOINT, IOT_PORT
+from alexa_api.iot.config_bundle import ConfigBundle
+from alexa_api.iot.timers import TimerRegistry
+from alexa_api.iot import GROUP_ORDER_MAX_DEVICES, ORDER_IO_WORKERS
 from AWSIoTPythonSDK.core.protocol.mqtt_core import connectTimeoutException
 
 
@@ -27,6 +33,25 @@ class IotToSnsDispatcherEvent:
         self.raw_event = event
 
 
+@dataclass
+class IotToSnsDispatcherBatch:
+    events: List[IotToSnsDispatcherEvent]
+
+    def __init__(self, event: Any):
+        # a plain list of IoT events, or records from an SQS/Kinesis buffer
+        if isinstance(event, list):
+            raw_events = event
+        else:
+            raw_events = [self._record_payload(record) for record in event["Records"]]
+        self.events = [IotToSnsDispatcherEvent(raw_event) for raw_event in raw_events]
+
+    @staticmethod
+    def _record_payload(record: Dict) -> Dict:
+        if "kinesis" in record:
+            return json.loads(base64.b64decode(record["kinesis"]["data"]))
+        return json.loads(record["body"])
+
+
 @dataclass
 class SendOrderRequest:
     device_id: ObjectId
@@ -39,86 +64,339 @@ class SendOrderRequest:
         self.timeout = int(timeout) if timeout else None
 
 
+@dataclass
+class GroupOrderRequest:
+    orders: Dict[ObjectId, bool]
+    timeout: Optional[int]
+
+    def __init__(self, orders: Any, timeout: Any):
+        try:
+            self.orders = {
+                ObjectId(device_id): bool(status) for device_id, status in orders.items()
+            }
+            self.timeout = int(timeout) if timeout else None
+        except (AttributeError, TypeError, ValueError) as e:
+            raise BadRequest(f"Invalid group order: {e}") from e
+        if not 0 < len(self.orders) <= GROUP_ORDER_MAX_DEVICES:
+            raise BadRequest(
+                f"A group order switches between 1 and {GROUP_ORDER_MAX_DEVICES} devices"
+            )
+
+
 @runtime_checkable
 class IIotService(Protocol):
-    def send(self):
+    def dispatch_sns(self, request: IotToSnsDispatcherEvent) -> None:
         ...
 
-    def dispatch_sns(self, request: IotToSnsDispatcherEvent) -> None:
+    def dispatch_sns_batch(self, request: IotToSnsDispatcherBatch) -> None:
         ...
 
     def send_order(self, request: SendOrderRequest) -> Dict:
         ...
 
+    async def send_order_async(self, request: SendOrderRequest) -> Dict:
+        ...
+
+    def send_group_order(self, request: GroupOrderRequest) -> Dict[str, Dict]:
+        ...
+
+    async def send_group_order_async(
+        self, request: GroupOrderRequest
+    ) -> Dict[str, Dict]:
+        ...
+
     def timer_fence(self, event: Dict) -> None:
         ...
 
     def stop_device(self, device_id: str, name: str) -> StateMachineErr:
         ...
 
-    def get_config(self) -> Dict:
+    def get_config(self) -> Tuple[str, str]:
         ...
 
 
 @inject(alias=IIotService)
 class IotService(IIotService):
     def __init__(
-        self, iot_repository: IotRepository, devices_repository: DevicesRepository
+        self,
+        iot_repository: IotRepository,
+        devices_repository: IDevicesRepository,
+        config_bundle: ConfigBundle,
+        timer_registry: TimerRegistry,
     ):
         self.iot_repository = iot_repository
         self.devices_repository = devices_repository
+        self.config_bundle = config_bundle
+        self.timer_registry = timer_registry
+        self.executor = ThreadPoolExecutor(max_workers=ORDER_IO_WORKERS)
 
     def dispatch_sns(self, event: IotToSnsDispatcherEvent) -> None:
 
+        if event.action == "reported":
+            # the device is the source of truth for its own status
+            self.devices_repository.invalidate(event.device_id)
         device = self.devices_repository.get(event.device_id)
         self.iot_repository.dispatch_sns(
             event.action, event.status, event.device_id, event.raw_event
         )
 
-        if event.action == "reported":
-            device.status = event.status
-            self.devices_repository.update(device)
+        if event.action == "reported" and device.status != event.status:
+            self.devices_repository.update_fields(
+                event.device_id, {"status": event.status}
+            )
 
-    def send_order(self, request: SendOrderRequest) -> Dict:
-        device = self.devices_repository.get(request.device_id)
-        if not device:
-            raise RecordNotFound(f"Device {str(request.device_id)} doesn't exist")
+    def dispatch_sns_batch(self, request: IotToSnsDispatcherBatch) -> None:
+        if not request.events:
+            return
+
+        self.iot_repository.dispatch_sns_batch(
+            [
+                (event.action, event.status, event.device_id, event.raw_event)
+                for event in request.events
+            ]
+        )
 
-        err_response: Dict = {
-            "info": "Device status not confirmed",
-            "err": IotErr.UNCONFIRMED,
+        # only the last report of every device needs to reach the table
+        reported = {
+            event.device_id: event.status
+            for event in request.events
+            if event.action == "reported"
         }
-        if device.status == request.status:
-            return {
-                "info": f"Device status already {request.status}",
-                "err": IotErr.EXISTING,
+        for device_id in reported:
+            self.devices_repository.invalidate(device_id)
+        for device in self.devices_repository.get_many(list(reported)):
+            if device.status != reported[device.device_id]:
+                try:
+                    self.devices_repository.update_fields(
+                        device.device_id, {"status": reported[device.device_id]}
+                    )
+                except RecordNotFound:
+                    # deleted since it was read, retrying the batch won't help
+                    continue
+
+    def send_order(self, request: SendOrderRequest) -> Dict:
+        return asyncio.run(self.send_order_async(request))
+
+    async def send_order_async(self, request: SendOrderRequest) -> Dict:
+        # the device read and the reported topic subscription start together
+        device_read = self._in_thread(self.devices_repository.get, request.device_id)
+        listening = (
+            asyncio.ensure_future(self._in_thread(self.iot_repository.listen_reported))
+            if request.timeout
+            else None
+        )
+        try:
+            device = await device_read
+            if not device:
+                raise RecordNotFound(f"Device {str(request.device_id)} doesn't exist")
+
+            err_response: Dict = {
+                "info": "Device status not confirmed",
+                "err": IotErr.UNCONFIRMED,
             }
+            if device.status == request.status:
+                return {
+                    "info": f"Device status already {request.status}",
+                    "err": IotErr.EXISTING,
+                }
 
-        if request.status:
-            for device_fence in self.devices_repository.get_device_fence_list(
-                device.device_fence
-            ):
-                if device_fence.status:
+            if request.status:
+                fenced_device, weather_fenced = await asyncio.gather(
+                    self._in_thread(self._fenced_device_on, device),
+                    self._in_thread(self._weather_fenced, device),
+                )
+                if fenced_device:
                     return {
-                        "info": f"Incompatible device {device_fence.device_id} is on",
+                        "info": f"Incompatible device {fenced_device} is on",
                         "err": IotErr.DEVICE_FENCED,
                     }
-
-            if device.weather_fence and device.weather_fence != 0:
-                if self.iot_repository.weather_fence(device.weather_fence):
+                if weather_fenced:
                     return {
                         "info": f"Device {device.device_id} stopped by weather fence",
                         "err": IotErr.WEATHER_FENCED,
                     }
 
-        self.iot_repository.send_order(request.device_id, request.status)
+            if listening:
+                await listening
+            await self._in_thread(
+                self.iot_repository.send_order, request.device_id, request.status
+            )
+
+            if request.timeout:
+                err_response = await self._in_thread(
+                    self.iot_repository.confirm_status,
+                    device,
+                    request.status,
+                    request.timeout,
+                )
+
+            return err_response
+        finally:
+            # cancelling can't stop the pool thread, so a rejected order waits
+            # for the subscription rather than leave it running past the response
+            if listening:
+                await listening
+
+    def send_group_order(self, request: GroupOrderRequest) -> Dict[str, Dict]:
+        return asyncio.run(self.send_group_order_async(request))
+
+    async def send_group_order_async(
+        self, request: GroupOrderRequest
+    ) -> Dict[str, Dict]:
+        # the timeout covers the whole order, not every device on its own
+        deadline = time.monotonic() + (request.timeout or 0)
+        device_read = self._in_thread(self._group_devices, list(request.orders))
+        listening = (
+            asyncio.ensure_future(self._in_thread(self.iot_repository.listen_reported))
+            if request.timeout
+            else None
+        )
+        try:
+            devices = await device_read
+            missing = [
+                str(device_id) for device_id in request.orders if str(device_id) not in devices
+            ]
+            if missing:
+                raise RecordNotFound(f"Devices {', '.join(missing)} don't exist")
 
-        if request.timeout:
-            err_response = self.iot_repository.confirm_status(
-                device, request.status, request.timeout
+            results, accepted = await self._in_thread(
+                self._admit_group, request, devices
             )
 
-        return err_response
+            # every distinct threshold is looked up once, all of them together
+            thresholds = {
+                devices[str(device_id)].weather_fence
+                for device_id, status in accepted.items()
+                if status and devices[str(device_id)].weather_fence
+            }
+            fenced_by = dict(
+                zip(
+                    thresholds,
+                    await asyncio.gather(
+                        *(
+                            self._in_thread(self.iot_repository.weather_fence, threshold)
+                            for threshold in thresholds
+                        )
+                    ),
+                )
+            )
+            for device_id, status in list(accepted.items()):
+                if status and fenced_by.get(devices[str(device_id)].weather_fence):
+                    results[str(device_id)] = {
+                        "info": f"Device {device_id} stopped by weather fence",
+                        "err": IotErr.WEATHER_FENCED,
+                    }
+                    del accepted[device_id]
+
+            if not accepted:
+                return results
+
+            if listening:
+                await listening
+            await self._in_thread(self.iot_repository.send_orders, accepted)
+
+            if request.timeout:
+                results.update(
+                    await self._in_thread(
+                        self.iot_repository.confirm_statuses,
+                        [
+                            (devices[str(device_id)], status)
+                            for device_id, status in accepted.items()
+                        ],
+                        max(deadline - time.monotonic(), 0),
+                    )
+                )
+            else:
+                results.update(
+                    {
+                        str(device_id): {
+                            "info": "Device status not confirmed",
+                            "err": IotErr.UNCONFIRMED,
+                        }
+                        for device_id in accepted
+                    }
+                )
+            return results
+        finally:
+            # as for single orders, the subscription must not outlive the response
+            if listening:
+                await listening
+
+    def _group_devices(self, device_ids: List[ObjectId]) -> Dict[str, Device]:
+        return {
+            str(device.device_id): device
+            for device in self.devices_repository.get_many(device_ids)
+        }
+
+    def _admit_group(
+        self, request: GroupOrderRequest, devices: Dict[str, Device]
+    ) -> Tuple[Dict[str, Dict], Dict[ObjectId, bool]]:
+        results: Dict[str, Dict] = {}
+        accepted: Dict[ObjectId, bool] = {}
+        # a device switched on by the same group counts as on for its fences
+        switched_on = {
+            str(device_id) for device_id, status in request.orders.items() if status
+        }
+        # the fences of every device switched on are read in one batch
+        fences_on = switched_on | self._fences_on(
+            [
+                devices[str(device_id)]
+                for device_id, status in request.orders.items()
+                if status and devices[str(device_id)].status != status
+            ]
+        )
+        for device_id, status in request.orders.items():
+            device = devices[str(device_id)]
+            if device.status == status:
+                results[str(device_id)] = {
+                    "info": f"Device status already {status}",
+                    "err": IotErr.EXISTING,
+                }
+                continue
+            if status:
+                fenced_device = self._first_fence_on(device, fences_on)
+                if fenced_device:
+                    results[str(device_id)] = {
+                        "info": f"Incompatible device {fenced_device} is on",
+                        "err": IotErr.DEVICE_FENCED,
+                    }
+                    continue
+            accepted[device_id] = status
+        return results, accepted
+
+    def _fenced_device_on(self, device: Device) -> Optional[str]:
+        return self._first_fence_on(device, self._fences_on([device]))
+
+    def _fences_on(self, devices: List[Device]) -> Set[str]:
+        # read live for every order, a stale status could let a fenced device on
+        fence_ids = {
+            str(fence_id) for device in devices for fence_id in device.device_fence or []
+        }
+        return {
+            str(fence.device_id)
+            for fence in self.devices_repository.get_device_fence_list(
+                [ObjectId(fence_id) for fence_id in fence_ids]
+            )
+            if fence.status
+        }
+
+    @staticmethod
+    def _first_fence_on(device: Device, fences_on: Set[str]) -> Optional[str]:
+        for fence_id in device.device_fence or []:
+            if str(fence_id) in fences_on:
+                return str(fence_id)
+        return None
+
+    def _weather_fenced(self, device: Device) -> bool:
+        if device.weather_fence and device.weather_fence != 0:
+            return self.iot_repository.weather_fence(device.weather_fence)
+        return False
+
+    def _in_thread(self, fn: Callable, *args: Any) -> Awaitable:
+        # boto3, the MQTT client and requests block, so they run on the pool
+        return asyncio.get_event_loop().run_in_executor(
+            self.executor, functools.partial(fn, *args)
+        )
 
     def timer_fence(self, event: Dict) -> None:
         device_id = event["state"]["reported"]["device_id"]
@@ -128,25 +406,21 @@ class IotService(IIotService):
         self.iot_repository.start_timer_fence(event, device_id, device.timer_fence)
 
     def stop_device(self, device_id: str, name: str) -> StateMachineErr:
-        state_machine = boto3.client("stepfunctions")
-        response = state_machine.list_executions(stateMachineArn=TIMER_FENCE_ARN, statusFilter='RUNNING')
-        for machine in response["executions"]:
-            if f"{device_id}-timer_fence" in machine["name"] and machine["name"] != name:
-                return StateMachineErr.FAIL
+        active_timer = self.timer_registry.active(device_id)
+        if active_timer is not None and active_timer != name:
+            # a newer timer owns the device now
+            return StateMachineErr.FAIL
         try:
             self.iot_repository.iot_subscribe()
             self.iot_repository.send_order(ObjectId(device_id), False)
         except connectTimeoutException:
             print("Timeout")
             return StateMachineErr.ALARM
+        finally:
+            self.timer_registry.release(device_id, name)
         if self.iot_repository.wait_reported(device_id, False):
             return StateMachineErr.SUCCESS
         return StateMachineErr.ALARM
 
-    def get_config(self) -> Dict:
-        s3 = boto3.resource("s3")
-        bucket = s3.Bucket(S3_CLIENT_CERTIFICATES)
-        certificates = {"certificates": {obj.key: obj.get()['Body'].read().decode('utf-8') for obj in bucket.objects.all()}}
-        iot_server = {"endpoint": IOT_ENDPOINT, "port": IOT_PORT}
-        topics = {"desired": DESIRED_TOPIC, "reported": REPORTED_TOPIC, "base": BASE_TOPIC}
-        return {**certificates, **iot_server, **topics}
+    def get_config(self) -> Tuple[str, str]:
+        return self.config_bundle.get()
@@ -0,0 +1,62 @@
+from typing import Any, Optional
+
+from botocore.exceptions import ClientError
+from kink import inject
+
+from alexa_api.devices.repository import TIMER_KEY
+from alexa_api.errors import AWSError
+
+
+@inject
+class TimerRegistry:
+    """Name of the timer fence execution currently owning each device.
+
+    Every new timer replaces the previous one, so a timer whose name is not
+    the registered one has been superseded and must not stop the device. The
+    items live in the devices table next to the position/GPIO sentinels and,
+    like them, carry an owner_id so device scans skip them.
+    """
+
+    def __init__(self, devices_table: Any) -> None:
+        self.table = devices_table
+
+    def register(self, device_id: str, execution_name: str) -> Optional[str]:
+        try:
+            result = self.table.put_item(
+                Item={
+                    "device_id": TIMER_KEY.format(device_id),
+                    "owner_id": device_id,
+                    "execution_name": execution_name,
+                },
+                ReturnValues="ALL_OLD",
+            )
+        except ClientError as e:
+            raise AWSError(
+                f"AWS error {e.response['Error']['Code']} registering timer {execution_name}"
+            ) from e
+        return result.get("Attributes", {}).get("execution_name")
+
+    def active(self, device_id: str) -> Optional[str]:
+        try:
+            result = self.table.get_item(
+                Key={"device_id": TIMER_KEY.format(device_id)}, ConsistentRead=True
+            )
+        except ClientError as e:
+            raise AWSError(
+                f"AWS error {e.response['Error']['Code']} reading timer of {device_id}"
+            ) from e
+        return result.get("Item", {}).get("execution_name")
+
+    def release(self, device_id: str, execution_name: str) -> None:
+        # a newer timer may have registered in the meantime, keep that one
+        try:
+            self.table.delete_item(
+                Key={"device_id": TIMER_KEY.format(device_id)},
+                ConditionExpression="execution_name = :execution_name",
+                ExpressionAttributeValues={":execution_name": execution_name},
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise AWSError(
+                    f"AWS error {e.response['Error']['Code']} releasing timer {execution_name}"
+                ) from e
@@ -0,0 +1,36 @@
+import threading
+import time
+from typing import Dict, Tuple
+
+WaiterKey = Tuple[str, bool]
+
+
+class ReportedWaiters:
+    """Thread-safe registry of callers waiting for a device to report a state.
+
+    Waiters are keyed by (device_id, is_on), so a single subscription to the
+    reported topic can wake any number of concurrent waiters without one
+    device's report discarding another's. The last report time of every key is
+    kept, so a report arriving before its waiter registers is not lost.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._events: Dict[WaiterKey, threading.Event] = {}
+        self._reported_at: Dict[WaiterKey, float] = {}
+
+    def resolve(self, device_id: str, status: bool) -> None:
+        key = (device_id, bool(status))
+        with self._lock:
+            self._reported_at[key] = time.monotonic()
+            event = self._events.pop(key, None)
+        if event:
+            event.set()
+
+    def wait(self, device_id: str, status: bool, timeout: float, since: float) -> bool:
+        key = (device_id, bool(status))
+        with self._lock:
+            if self._reported_at.get(key, float("-inf")) >= since:
+                return True
+            event = self._events.setdefault(key, threading.Event())
+        return event.wait(timeout)
@@ -0,0 +1,91 @@
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import requests
+from kink import inject
+
+from alexa_api.metrics import span
+
+from alexa_api.iot import (
+    OW_ENDPOINT,
+    OW_APPID,
+    OW_CONNECT_TIMEOUT,
+    OW_READ_TIMEOUT,
+    OW_CACHE_TTL,
+    OW_STALE_TTL,
+)
+
+Location = Tuple[str, str]
+
+
+@inject
+class WeatherProvider:
+    """Cached OpenWeather humidity readings keyed by (lat, lon).
+
+    Fresh observations are served from memory. Expired ones are still served
+    for OW_STALE_TTL seconds while a background refresh runs. Concurrent
+    requests for the same location share a single upstream call.
+    """
+
+    def __init__(self) -> None:
+        self.session = requests.Session()
+        self._observations: Dict[Location, Tuple[float, int]] = {}
+        self._inflight: Dict[Location, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def humidity(self, lat: str, lon: str) -> Optional[int]:
+        location = (lat, lon)
+        with self._lock:
+            observation = self._observations.get(location)
+            if observation:
+                age = time.monotonic() - observation[0]
+                if age < OW_CACHE_TTL:
+                    return observation[1]
+                if age < OW_CACHE_TTL + OW_STALE_TTL:
+                    if location not in self._inflight:
+                        self._inflight[location] = threading.Event()
+                        threading.Thread(
+                            target=self._refresh, args=(location,), daemon=True
+                        ).start()
+                    return observation[1]
+
+            pending = self._inflight.get(location)
+            if pending is None:
+                self._inflight[location] = threading.Event()
+
+        if pending is None:
+            self._refresh(location)
+        else:
+            pending.wait(OW_CONNECT_TIMEOUT + OW_READ_TIMEOUT)
+
+        observation = self._observations.get(location)
+        return observation[1] if observation else None
+
+    def _refresh(self, location: Location) -> None:
+        try:
+            humidity = self._fetch(location)
+            if humidity is not None:
+                with self._lock:
+                    self._observations[location] = (time.monotonic(), humidity)
+        finally:
+            with self._lock:
+                done = self._inflight.pop(location, None)
+            if done:
+                done.set()
+
+    def _fetch(self, location: Location) -> Optional[int]:
+        payload = (("lat", location[0]), ("lon", location[1]), ("appid", OW_APPID))
+        try:
+            with span("openweather", "weather"):
+                response = self.session.get(
+                    OW_ENDPOINT,
+                    params=payload,
+                    timeout=(OW_CONNECT_TIMEOUT, OW_READ_TIMEOUT),
+                )
+        except requests.RequestException as e:
+            print("Weather request failed:", e)
+            return None
+        if response.status_code not in range(200, 300):
+            return None
+        return int(response.json()["main"]["humidity"])
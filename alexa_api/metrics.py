@@ -0,0 +1,154 @@
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from os import environ
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+METRICS_NAMESPACE = environ.get("METRICS_NAMESPACE", "AlexaApi")
+# share of invocations whose spans are recorded and emitted, 0 switches them off
+METRICS_SAMPLE_RATE = float(environ.get("METRICS_SAMPLE_RATE", 1))
+
+# values CloudWatch accepts in the array of a single metric
+EMF_MAX_VALUES = 100
+
+SpanKey = Tuple[str, str]
+
+
+class Invocation:
+    """Dependency call durations, in milliseconds, recorded during one invocation"""
+
+    def __init__(self, handler: str, cold: bool) -> None:
+        self.handler = handler
+        self.cold = cold
+        self.started = time.perf_counter()
+        self.spans: Dict[SpanKey, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, dependency: str, operation: str, elapsed_ms: float) -> None:
+        # spans also arrive from the worker threads of the handler
+        with self._lock:
+            self.spans.setdefault((dependency, operation), []).append(elapsed_ms)
+
+
+# a container runs one invocation at a time
+_current: Optional[Invocation] = None
+_cold = True
+
+
+@contextmanager
+def invocation(handler: str) -> Iterator[Optional[Invocation]]:
+    global _current, _cold
+    cold, _cold = _cold, False
+    current = (
+        Invocation(handler, cold) if random.random() < METRICS_SAMPLE_RATE else None
+    )
+    _current = current
+    try:
+        yield current
+    finally:
+        _current = None
+        if current:
+            _emit(current)
+
+
+@contextmanager
+def span(dependency: str, operation: str) -> Iterator[None]:
+    current = _current
+    if current is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        current.record(dependency, operation, (time.perf_counter() - started) * 1000)
+
+
+def instrumented(handler: Callable) -> Callable:
+    @wraps(handler)
+    def _instrumented(*args, **kwargs):
+        with invocation(handler_name(handler, args)):
+            return handler(*args, **kwargs)
+
+    return _instrumented
+
+
+def handler_name(handler: Callable, args: Tuple) -> str:
+    # the deployed function name, falling back to the handler's own
+    context = args[1] if len(args) > 1 else None
+    return getattr(context, "function_name", None) or handler.__name__
+
+
+def record_aws_calls(session: Any) -> None:
+    """Record a span for every API call of the clients built from `session`"""
+
+    def _before_call(model: Any, context: Dict, **kwargs: Any) -> None:
+        if _current is not None:
+            context["metrics_started"] = time.perf_counter()
+
+    def _after_call(model: Any, context: Dict, **kwargs: Any) -> None:
+        started = context.get("metrics_started")
+        current = _current
+        if started is not None and current is not None:
+            current.record(
+                model.service_model.service_name,
+                model.name,
+                (time.perf_counter() - started) * 1000,
+            )
+
+    session.events.register("before-call", _before_call)
+    session.events.register("after-call", _after_call)
+
+
+def _emit(current: Invocation) -> None:
+    # CloudWatch embedded metric format, one line per metric set
+    timestamp = int(time.time() * 1000)
+    print(
+        json.dumps(
+            {
+                "_aws": _directive(
+                    timestamp, [["handler"], ["handler", "start"]], "duration"
+                ),
+                "handler": current.handler,
+                "start": "cold" if current.cold else "warm",
+                "duration": (time.perf_counter() - current.started) * 1000,
+            }
+        )
+    )
+    for (dependency, operation), values in current.spans.items():
+        # larger arrays are rejected whole, so they are split across lines
+        for start in range(0, len(values), EMF_MAX_VALUES):
+            print(
+                json.dumps(
+                    {
+                        "_aws": _directive(
+                            timestamp,
+                            [
+                                ["dependency", "operation"],
+                                ["handler", "dependency", "operation"],
+                            ],
+                            "latency",
+                        ),
+                        "handler": current.handler,
+                        "dependency": dependency,
+                        "operation": operation,
+                        "latency": values[start : start + EMF_MAX_VALUES],
+                    }
+                )
+            )
+
+
+def _directive(timestamp: int, dimensions: List[List[str]], metric: str) -> Dict:
+    return {
+        "Timestamp": timestamp,
+        "CloudWatchMetrics": [
+            {
+                "Namespace": METRICS_NAMESPACE,
+                "Dimensions": dimensions,
+                "Metrics": [{"Name": metric, "Unit": "Milliseconds"}],
+            }
+        ],
+    }
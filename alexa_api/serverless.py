@@ -1,22 +1,25 @@
 from typing import Any
 from functools import wraps
+import json
 
 from alexa_api.errors import ApiError
+from alexa_api.metrics import handler_name, invocation
 
 
 def serverless(serverless_handler: Any) -> Any:
     def _inner(fn: Any) -> Any:
         @wraps(fn)
         def execute_serverless(*args, **kwargs):
-            try:
-                return fn(*args, **kwargs)
-            except ApiError as e:
-                return {
-                    "statusCode": e.status_code,
-                    "body": '{"error": "' + str(e) + '"}',
-                }
-            except Exception as e:
-                return {"statusCode": 500, "body": '{"error": "' + str(e) + '"}'}
+            with invocation(handler_name(fn, args)):
+                try:
+                    return fn(*args, **kwargs)
+                except ApiError as e:
+                    return {
+                        "statusCode": e.status_code,
+                        "body": json.dumps({"error": str(e)}),
+                    }
+                except Exception as e:
+                    return {"statusCode": 500, "body": json.dumps({"error": str(e)})}
 
         return execute_serverless
 
@@ -0,0 +1,204 @@
+"""Throughput and latency of the Lambda handlers against in-process fakes.
+
+    python -m benchmarks.handlers [--fleet 10,100,1000] [--requests 200]
+        [--db-latency MS] [--mqtt-latency MS] [--device-latency MS]
+        [--aws-latency MS] [--weather-latency MS]
+
+The kink container is wired to benchmarks.fakes, so every handler runs its
+real controller, service and repository code without touching AWS. Each
+handler is driven sequentially against a table holding `fleet` devices.
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Iterator, List
+
+from bson import ObjectId
+from kink import di
+
+from alexa_api.aws import AwsClients
+from alexa_api.devices.repository import IDevicesRepository
+from alexa_api.intents.alexa_data import Device
+from alexa_api.iot.weather import WeatherProvider
+from benchmarks.fakes import (
+    FakeAwsClients,
+    FakeDatabase,
+    FakeMqttClient,
+    FakeWeather,
+)
+from benchmarks.skill_dispatch import alexa_event
+
+POOL_INTENT = "EnciendePiscinaIntent"
+# the dialog catalog outlives reseeding, so the pool keeps the same id
+POOL_DEVICE_ID = ObjectId("5f0000000000000000000001")
+
+
+def wire(args: argparse.Namespace) -> FakeDatabase:
+    # must run before the first handler call, kink caches what it injects
+    database = FakeDatabase(args.db_latency / 1000)
+    devices_table = database.table("devices", "device_id")
+    di["devices_table"] = devices_table
+    di["dialogs_table"] = database.table("dialogs", "id")
+    di["fences_table"] = database.table("fences", "fenced_id", "device_id")
+    di["iot"] = FakeMqttClient(
+        devices_table, args.mqtt_latency / 1000, args.device_latency / 1000
+    )
+    di[AwsClients] = FakeAwsClients(args.aws_latency / 1000)
+    di[WeatherProvider] = FakeWeather(args.weather_latency / 1000)
+    return database
+
+
+def seed(database: FakeDatabase, fleet: int) -> List[str]:
+    database.clear()
+    di[IDevicesRepository].invalidate()
+    repository = di[IDevicesRepository]
+    device_ids: List[str] = []
+    for index in range(fleet):
+        # every device is fenced by the two created before it
+        device = Device(
+            name=f"device {index}",
+            description=None,
+            position=index,
+            GPIO=index,
+            device_fence=device_ids[-2:] or None,
+            device_id=ObjectId() if index else POOL_DEVICE_ID,
+        )
+        repository.insert(device)
+        device_ids.append(str(device.device_id))
+
+    dialogs = di["dialogs_table"]
+    for iot_err in range(6):
+        dialogs.put_item(
+            Item={
+                "id": f"{POOL_INTENT}-{iot_err}",
+                "intent_id": POOL_INTENT,
+                "iot_err": iot_err,
+                "speak": "vale",
+                "locale": "es-ES",
+                "device_id": str(POOL_DEVICE_ID),
+            }
+        )
+    return device_ids
+
+
+def context(function_name: str) -> SimpleNamespace:
+    return SimpleNamespace(function_name=function_name)
+
+
+def fake_credentials() -> None:
+    # requests are signed before the fakes see them
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+
+
+@contextlib.contextmanager
+def quiet() -> Iterator[None]:
+    # handlers print their own traces, keep them out of the report
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def scenarios(device_ids: List[str], fleet: int) -> Dict[str, Callable[[int], Any]]:
+    from alexa_api import controller
+
+    def create_device(index: int) -> Any:
+        body = {"name": f"new {index}", "position": fleet + index, "GPIO": fleet + index}
+        return controller.create_device({"body": json.dumps(body)}, context("create_device"))
+
+    def get_device_list(index: int) -> Any:
+        return controller.get_device_list(
+            {"queryStringParameters": None}, context("get_device_list")
+        )
+
+    def iot_send_order(index: int) -> Any:
+        device_id = random.choice(device_ids)
+        status = not di["devices_table"].get_item(Key={"device_id": device_id})["Item"]["status"]
+        event = {
+            "pathParameters": {"device_id": device_id},
+            "body": json.dumps({"status": status, "timeout": 5}),
+        }
+        return controller.iot_send_order(event, context("iot_send_order"))
+
+    def skill_handler(index: int) -> Any:
+        return controller.skill_handler(alexa_event(POOL_INTENT), context("skill_handler"))
+
+    def iot_to_sns_dispatcher(index: int) -> Any:
+        event = {
+            "state": {
+                "reported": {
+                    "device_id": random.choice(device_ids),
+                    "is_on": bool(index % 2),
+                }
+            }
+        }
+        return controller.iot_to_sns_dispatcher(event, context("iot_to_sns_dispatcher"))
+
+    return {
+        "create_device": create_device,
+        "get_device_list": get_device_list,
+        "iot_send_order": iot_send_order,
+        "skill_handler": skill_handler,
+        "iot_to_sns_dispatcher": iot_to_sns_dispatcher,
+    }
+
+
+def percentile(samples: List[float], share: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * share))]
+
+
+def run(handler: Callable[[int], Any], requests: int) -> List[float]:
+    latencies = []
+    with quiet():
+        for index in range(requests):
+            started = time.perf_counter()
+            response = handler(index)
+            latencies.append(time.perf_counter() - started)
+            if isinstance(response, dict) and response.get("statusCode", 200) >= 400:
+                raise RuntimeError(f"{handler.__name__} failed: {response}")
+    return latencies
+
+
+def main(args: argparse.Namespace) -> None:
+    fake_credentials()
+    database = wire(args)
+
+    print(f"{'fleet':>6} {'handler':22} {'req/s':>9} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8}")
+    for fleet in args.fleet:
+        device_ids = seed(database, fleet)
+        for name, handler in scenarios(device_ids, fleet).items():
+            latencies = run(handler, args.requests)
+            total = sum(latencies)
+            latencies.sort()
+            print(
+                f"{fleet:6} {name:22} {len(latencies) / total:9.1f} "
+                f"{percentile(latencies, 0.5) * 1e3:8.2f} "
+                f"{percentile(latencies, 0.9) * 1e3:8.2f} "
+                f"{percentile(latencies, 0.99) * 1e3:8.2f}"
+            )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--fleet",
+        type=lambda value: [int(size) for size in value.split(",")],
+        default=[10, 100, 1000],
+        help="comma separated fleet sizes",
+    )
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--db-latency", type=float, default=0.0, help="ms per DynamoDB call")
+    parser.add_argument("--mqtt-latency", type=float, default=0.0, help="ms per MQTT call")
+    parser.add_argument(
+        "--device-latency", type=float, default=0.0, help="ms until a device reports"
+    )
+    parser.add_argument("--aws-latency", type=float, default=0.0, help="ms per SNS/Step Functions call")
+    parser.add_argument("--weather-latency", type=float, default=0.0, help="ms per weather lookup")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(parse_args())
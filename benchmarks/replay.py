@@ -0,0 +1,341 @@
+"""Replays captured Lambda events against the controller handlers.
+
+    python -m benchmarks.replay CAPTURE.jsonl [CAPTURE.jsonl ...]
+        [--concurrency 1] [--rate REQ/S] [--speed FACTOR] [--loop 1] [--live]
+        [--db-latency MS] [--mqtt-latency MS] [--device-latency MS]
+        [--aws-latency MS] [--weather-latency MS]
+
+Every line of a capture is one event, either bare or wrapped as
+{"event": {...}, "timestamp": 1600000000.0, "handler": "get_device"}. The
+handler is taken from the wrapper or guessed from the event shape: API
+Gateway events are routed by method and resource as in serverless.yml,
+Alexa requests go to skill_handler, IoT rule events to iot_to_sns_dispatcher,
+SQS and Kinesis batches to iot_to_sns_batch_dispatcher and SNS records to
+timer_fence.
+
+Events are sent at their recorded pace divided by --speed, never faster than
+--rate, with up to --concurrency of them in flight. Without timestamps or a
+rate they are sent as fast as the workers take them. By default the handlers
+run against benchmarks.fakes, seeded with the devices the capture refers to;
+--live runs them against the AWS resources of the environment instead.
+"""
+import argparse
+import json
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from bson import ObjectId
+from kink import di
+
+from alexa_api import metrics
+from alexa_api.devices.repository import IDevicesRepository
+from alexa_api.intents.alexa_data import Device
+from alexa_api.iot.iot import IotErr, StateMachineErr
+from alexa_api.iot.service import IotToSnsDispatcherBatch
+from benchmarks.fakes import FakeDatabase
+from benchmarks.handlers import (
+    POOL_DEVICE_ID,
+    context,
+    fake_credentials,
+    percentile,
+    quiet,
+    wire,
+)
+
+API_ROUTES = {
+    ("GET", "/config"): "get_config",
+    ("POST", "/devices"): "create_device",
+    ("GET", "/devices"): "get_device_list",
+    ("GET", "/devices/{device_id}"): "get_device",
+    ("PUT", "/devices/{device_id}"): "update_device",
+    ("DELETE", "/devices/{device_id}"): "delete_device",
+    ("POST", "/change/{device_id}"): "iot_send_order",
+    ("POST", "/devices/orders"): "iot_send_group_order",
+}
+
+
+class Call:
+    __slots__ = ("handler", "event", "timestamp")
+
+    def __init__(self, handler: str, event: Dict, timestamp: Optional[float]) -> None:
+        self.handler = handler
+        self.event = event
+        self.timestamp = timestamp
+
+
+def read_captures(paths: List[str]) -> List[Call]:
+    calls = []
+    for path in paths:
+        with open(path) as capture:
+            for number, line in enumerate(capture, 1):
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                wrapped = isinstance(record.get("event"), dict)
+                event = record["event"] if wrapped else record
+                handler = (record.get("handler") if wrapped else None) or route(event)
+                if handler is None:
+                    raise ValueError(f"{path}:{number}: no handler for this event")
+                timestamp = record.get("timestamp") if wrapped else None
+                calls.append(Call(handler, event, _timestamp(timestamp, event)))
+    return calls
+
+
+def route(event: Dict) -> Optional[str]:
+    if "httpMethod" in event:
+        resource = event.get("resource") or _resource(event.get("path", ""))
+        return API_ROUTES.get((event["httpMethod"].upper(), resource))
+    if "version" in event and "request" in event:
+        return "skill_handler"
+    records = event.get("Records")
+    if records:
+        if records[0].get("eventSource") in ("aws:sqs", "aws:kinesis"):
+            return "iot_to_sns_batch_dispatcher"
+        if records[0].get("EventSource") == "aws:sns":
+            return "timer_fence"
+        return None
+    if "state" in event:
+        # the timer state machine adds its execution name to the IoT event
+        return "stop_device" if "name" in event else "iot_to_sns_dispatcher"
+    return None
+
+
+def _resource(path: str) -> str:
+    parts = path.rstrip("/").split("/")
+    if "/".join(parts) in {resource for _, resource in API_ROUTES}:
+        return "/".join(parts)
+    if len(parts) == 3 and parts[1] in ("devices", "change"):
+        parts[2] = "{device_id}"
+    return "/".join(parts) or "/"
+
+
+def _timestamp(timestamp: Any, event: Dict) -> Optional[float]:
+    if timestamp is None:
+        epoch = (event.get("requestContext") or {}).get("requestTimeEpoch")
+        if epoch is not None:
+            return epoch / 1000
+        timestamp = (event.get("request") or {}).get("timestamp")
+    if timestamp is None or isinstance(timestamp, (int, float)):
+        return timestamp
+    return datetime.fromisoformat(timestamp.replace("Z", "+00:00")).timestamp()
+
+
+def seed(database: FakeDatabase, calls: List[Call]) -> None:
+    """Creates the devices and dialogs the captured events refer to"""
+    device_ids: Set[str] = set()
+    intents: Set[str] = set()
+    for call in calls:
+        device_ids.update(filter(ObjectId.is_valid, _device_ids(call)))
+        intent = ((call.event.get("request") or {}).get("intent") or {}).get("name")
+        if intent:
+            intents.add(intent)
+    device_ids.add(str(POOL_DEVICE_ID))
+
+    database.clear()
+    di[IDevicesRepository].invalidate()
+    repository = di[IDevicesRepository]
+    for index, device_id in enumerate(sorted(device_ids)):
+        repository.insert(
+            Device(
+                name=f"device {index}",
+                description=None,
+                position=index,
+                GPIO=index,
+                device_fence=None,
+                device_id=ObjectId(device_id),
+            )
+        )
+
+    dialogs = di["dialogs_table"]
+    for intent in intents:
+        for iot_err in IotErr:
+            dialogs.put_item(
+                Item={
+                    "id": f"{intent}-{int(iot_err)}",
+                    "intent_id": intent,
+                    "iot_err": int(iot_err),
+                    "speak": "vale",
+                    "locale": "es-ES",
+                    "device_id": str(POOL_DEVICE_ID),
+                }
+            )
+
+
+def _device_ids(call: Call) -> List[str]:
+    if call.handler == "iot_send_group_order":
+        return list(json.loads(call.event["body"]).get("orders") or {})
+    if call.handler == "iot_to_sns_batch_dispatcher":
+        return [str(event.device_id) for event in IotToSnsDispatcherBatch(call.event).events]
+    device_id = (call.event.get("pathParameters") or {}).get("device_id") or (
+        (call.event.get("state") or {}).get("reported") or {}
+    ).get("device_id")
+    return [device_id] if device_id else []
+
+
+def schedule(calls: List[Call], speed: float, rate: float) -> Iterator[Tuple[float, Call]]:
+    """Yields every call with its offset, in seconds, from the start of the replay"""
+    first = next((call.timestamp for call in calls if call.timestamp is not None), None)
+    interval = 1 / rate if rate else 0.0
+    previous = -interval
+    for call in calls:
+        offset = 0.0
+        if speed and first is not None and call.timestamp is not None:
+            offset = max(0.0, call.timestamp - first) / speed
+        previous = max(offset, previous + interval)
+        yield previous, call
+
+
+def outcome(handler: str, response: Any) -> str:
+    if isinstance(response, dict) and "statusCode" in response:
+        status = str(response["statusCode"])
+        if handler == "iot_send_order" and response["statusCode"] == 200:
+            return f"{status} {IotErr(json.loads(response['body'])['err']).name}"
+        if handler == "iot_send_group_order" and response["statusCode"] == 200:
+            # one outcome per group, made of the errors of its devices
+            errors = Counter(
+                IotErr(result["err"]).name
+                for result in json.loads(response["body"])["orders"].values()
+            )
+            return f"{status} " + " ".join(
+                f"{name}x{count}" for name, count in sorted(errors.items())
+            )
+        return status
+    if isinstance(response, dict) and "result" in response:
+        return StateMachineErr(response["result"]).name
+    return "ok"
+
+
+class Report:
+    def __init__(self) -> None:
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.outcomes: Dict[str, Counter] = defaultdict(Counter)
+        self.late: List[float] = []
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, handler: str, latency: float, result: str, late: float) -> None:
+        with self._lock:
+            self.latencies[handler].append(latency)
+            self.outcomes[handler][result] += 1
+            self.late.append(late)
+
+    def write(self) -> None:
+        elapsed = self.elapsed
+        total = sum(len(latencies) for latencies in self.latencies.values())
+        print(f"{total} events in {elapsed:.2f}s, {total / elapsed:.1f} req/s")
+        if self.late:
+            self.late.sort()
+            print(f"sent late by p50 {percentile(self.late, 0.5) * 1e3:.2f}ms, "
+                  f"max {self.late[-1] * 1e3:.2f}ms")
+        for handler in sorted(self.latencies):
+            latencies = sorted(self.latencies[handler])
+            print(
+                f"\n{handler}: {len(latencies)} events, "
+                f"p50 {percentile(latencies, 0.5) * 1e3:.2f}ms "
+                f"p90 {percentile(latencies, 0.9) * 1e3:.2f}ms "
+                f"p99 {percentile(latencies, 0.99) * 1e3:.2f}ms"
+            )
+            for bucket, count in histogram(latencies):
+                bar = "#" * math.ceil(40 * count / len(latencies))
+                print(f"  {bucket:>14} {count:7} {bar}")
+            outcomes = ", ".join(
+                f"{result}: {count}" for result, count in self.outcomes[handler].most_common()
+            )
+            print(f"  {outcomes}")
+
+
+def histogram(latencies: List[float]) -> List[Tuple[str, int]]:
+    """Counts the latencies in power of two millisecond buckets"""
+    counts: Counter = Counter()
+    for latency in latencies:
+        counts[max(0, math.ceil(math.log2(max(latency * 1e3, 1e-3))))] += 1
+    buckets = []
+    for exponent in range(min(counts), max(counts) + 1):
+        low = f"{2 ** (exponent - 1)}" if exponent else "0"
+        buckets.append((f"{low}-{2 ** exponent} ms", counts[exponent]))
+    return buckets
+
+
+def replay(calls: List[Call], args: argparse.Namespace) -> Report:
+    from alexa_api import controller
+
+    handlers: Dict[str, Callable] = {
+        name: getattr(controller, name) for name in {call.handler for call in calls}
+    }
+    report = Report()
+    slots = threading.BoundedSemaphore(args.concurrency)
+
+    def dispatch(call: Call, due: float) -> None:
+        try:
+            late = time.perf_counter() - due
+            started = time.perf_counter()
+            try:
+                result = outcome(
+                    call.handler, handlers[call.handler](call.event, context(call.handler))
+                )
+            except Exception as e:
+                result = type(e).__name__
+            report.add(call.handler, time.perf_counter() - started, result, late)
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(args.concurrency) as executor:
+        started = time.perf_counter()
+        for _ in range(args.loop):
+            loop_started = time.perf_counter()
+            for offset, call in schedule(calls, args.speed, args.rate):
+                due = loop_started + offset
+                wait = due - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+                slots.acquire()
+                executor.submit(dispatch, call, due)
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+def main(args: argparse.Namespace) -> None:
+    calls = read_captures(args.captures)
+    if not calls:
+        raise SystemExit("the captures hold no events")
+    if not args.live:
+        fake_credentials()
+        seed(wire(args), calls)
+    # spans assume one invocation at a time per container
+    metrics.METRICS_SAMPLE_RATE = 0
+
+    with quiet():
+        report = replay(calls, args)
+    report.write()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("captures", nargs="+", help="JSONL files of captured events")
+    parser.add_argument("--concurrency", type=int, default=1, help="events in flight")
+    parser.add_argument("--rate", type=float, default=0.0, help="max events per second")
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="time compression of the recorded pace, 0 ignores the timestamps",
+    )
+    parser.add_argument("--loop", type=int, default=1, help="times the captures are replayed")
+    parser.add_argument("--live", action="store_true", help="use the AWS resources of the environment")
+    parser.add_argument("--db-latency", type=float, default=0.0, help="ms per DynamoDB call")
+    parser.add_argument("--mqtt-latency", type=float, default=0.0, help="ms per MQTT call")
+    parser.add_argument(
+        "--device-latency", type=float, default=0.0, help="ms until a device reports"
+    )
+    parser.add_argument("--aws-latency", type=float, default=0.0, help="ms per SNS/Step Functions call")
+    parser.add_argument("--weather-latency", type=float, default=0.0, help="ms per weather lookup")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(parse_args())
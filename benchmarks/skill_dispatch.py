@@ -0,0 +1,101 @@
+"""Per-request overhead of the Alexa skill handler, without any AWS call.
+
+    python -m benchmarks.skill_dispatch [iterations]
+
+"before" assembles a SkillBuilder and runs the linear can_handle chain on
+every request, "after" reuses the memoized skill and its indexed mapper.
+"""
+import json
+import sys
+import timeit
+
+from ask_sdk_core.skill_builder import SkillBuilder
+from ask_sdk_model import RequestEnvelope
+from bson import ObjectId
+
+from alexa_api.intents.alexa_data import Dialog
+from alexa_api.intents.alexa_service import (
+    LaunchRequestHandler,
+    HelpIntentHandler,
+    CancelOrStopIntentHandler,
+    SessionEndedRequestHandler,
+    IntentReflectorHandler,
+    CatchAllExceptionHandler,
+    EnciendePiscinaIntent,
+    ApagaPiscinaIntent,
+    build_skill,
+)
+
+
+class StubAlexaRepository:
+    def get_dialog(self, intent_name, iot_err=0, locale="es-ES"):
+        return Dialog(
+            id="1",
+            intent_id=intent_name,
+            speak="hola",
+            ask="¿algo más?",
+            iot_err=iot_err,
+            device_id=ObjectId(),
+            locale=locale,
+            description=None,
+        )
+
+
+def alexa_event(intent_name):
+    return {
+        "version": "1.0",
+        "session": {
+            "new": False,
+            "sessionId": "amzn1.echo-api.session.1",
+            "application": {"applicationId": "amzn1.ask.skill.1"},
+            "user": {"userId": "amzn1.ask.account.1"},
+        },
+        "context": {},
+        "request": {
+            "type": "IntentRequest",
+            "requestId": "amzn1.echo-api.request.1",
+            "timestamp": "2020-01-01T00:00:00Z",
+            "locale": "es-ES",
+            "intent": {"name": intent_name, "confirmationStatus": "NONE"},
+        },
+    }
+
+
+def before(alexa_repository, event):
+    sb = SkillBuilder()
+    sb.add_request_handler(LaunchRequestHandler(alexa_repository))
+    sb.add_request_handler(EnciendePiscinaIntent(alexa_repository))
+    sb.add_request_handler(ApagaPiscinaIntent(alexa_repository))
+    sb.add_request_handler(HelpIntentHandler(alexa_repository))
+    sb.add_request_handler(CancelOrStopIntentHandler(alexa_repository))
+    sb.add_request_handler(SessionEndedRequestHandler())
+    sb.add_request_handler(IntentReflectorHandler(alexa_repository))
+    sb.add_exception_handler(CatchAllExceptionHandler(alexa_repository))
+    return sb.lambda_handler()(event, None)
+
+
+def after(skill, event):
+    request_envelope = skill.serializer.deserialize(
+        payload=json.dumps(event), obj_type=RequestEnvelope
+    )
+    response_envelope = skill.invoke(request_envelope=request_envelope, context=None)
+    return skill.serializer.serialize(response_envelope)
+
+
+def main(iterations: int) -> None:
+    alexa_repository = StubAlexaRepository()
+    skill = build_skill(alexa_repository)
+    # the reflector sits at the end of the chain, the worst case for can_handle
+    for intent_name in ("AMAZON.HelpIntent", "UnknownIntent"):
+        event = alexa_event(intent_name)
+        assert before(alexa_repository, event) == after(skill, event)
+        for name, run in (
+            ("before", lambda: before(alexa_repository, event)),
+            ("after", lambda: after(skill, event)),
+        ):
+            elapsed = timeit.timeit(run, number=iterations)
+            print(f"{intent_name:20} {name:6} {elapsed / iterations * 1e6:9.1f} us/request")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,70 @@
+"""Cost of the IoT event to SNS dispatch path, with SNS stubbed out.
+
+    python -m benchmarks.sns_dispatch [iterations]
+
+"before" creates a boto3 SNS client for every event, as dispatch_sns used
+to; "after" goes through IotRepository.dispatch_sns and the shared
+AwsClients registry.
+"""
+import json
+import sys
+import timeit
+
+import boto3
+from botocore.stub import Stubber
+from bson import ObjectId
+from kink import di
+
+from alexa_api.aws import AwsClients
+from alexa_api.iot.repository import IotRepository
+from benchmarks.handlers import fake_credentials
+
+SNS_ARN = "arn:aws:sns:us-east-1:000000000000:DeviceChanged"
+
+
+def iot_event(device_id):
+    return {"state": {"reported": {"is_on": True, "device_id": str(device_id)}}}
+
+
+def before(device_id):
+    client = boto3.client("sns", region_name="us-east-1")
+    with Stubber(client) as stubber:
+        stubber.add_response("publish", {"MessageId": "1"})
+        client.publish(
+            TopicArn=SNS_ARN,
+            Message=json.dumps({"default": json.dumps(iot_event(device_id))}),
+            MessageStructure="json",
+        )
+
+
+def main(iterations: int) -> None:
+    fake_credentials()
+    device_id = ObjectId()
+    aws_clients = AwsClients()
+    # only the SNS path runs, so the other dependencies are left out. kink
+    # resolves every argument that isn't positional, so they are bound by
+    # name first to keep it from building the real ones
+    dependencies = dict(
+        iot_connection=None,
+        devices_repository=None,
+        weather_provider=None,
+        aws_clients=aws_clients,
+        timer_registry=None,
+    )
+    for name, dependency in dependencies.items():
+        di[name] = dependency
+    iot_repository = IotRepository(**dependencies)
+    stubber = Stubber(aws_clients.client("sns"))
+    stubber.activate()
+
+    def after():
+        stubber.add_response("publish", {"MessageId": "1"})
+        iot_repository.dispatch_sns("reported", True, device_id, iot_event(device_id))
+
+    for name, run in (("before", lambda: before(device_id)), ("after", after)):
+        elapsed = timeit.timeit(run, number=iterations)
+        print(f"{name:6} {elapsed / iterations * 1e3:8.3f} ms/event")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,82 @@
+"""One-off backfill of the items devices written before they existed lack.
+
+    python -m scripts.backfill_device_index [--dry-run]
+
+Writes, for every device in the table, the position#n and GPIO#n sentinel
+items that enforce position and GPIO uniqueness, and the fences table items
+indexing which devices fence it. Only writes made through the repository
+keep them current, so devices created before they were introduced have
+none: their position and GPIO can be taken twice and deleting the devices
+they fence leaves dangling references.
+
+Run it once per stage with the usual DB_DEVICES_TABLE, DB_FENCES_TABLE and
+AWS environment. It is idempotent: sentinels already owned by the device are
+left as they are. Two devices sharing a position or GPIO are reported and
+skipped, one of them has to be moved by hand and the script run again.
+"""
+import argparse
+from typing import Dict
+
+from botocore.exceptions import ClientError
+from kink import di
+
+from alexa_api.devices import DB_SCAN_SEGMENTS
+from alexa_api.devices.repository import UNIQUE_ATTRIBUTES, DevicesRepository
+from alexa_api.errors import RecordNotFound
+
+
+def backfill(devices_repository: DevicesRepository, dry_run: bool = False) -> Dict:
+    counts = {"devices": 0, "sentinels": 0, "fences": 0, "conflicts": 0}
+    try:
+        devices = list(devices_repository.get_list(DB_SCAN_SEGMENTS))
+    except RecordNotFound:
+        return counts
+
+    for device in devices:
+        counts["devices"] += 1
+        owner_id = str(device.device_id)
+        for attribute in UNIQUE_ATTRIBUTES:
+            value = getattr(device, attribute)
+            if value is None:
+                continue
+            counts["sentinels"] += 1
+            if dry_run:
+                continue
+            try:
+                devices_repository.table.put_item(
+                    Item={"device_id": f"{attribute}#{int(value)}", "owner_id": owner_id},
+                    ConditionExpression="attribute_not_exists(device_id) OR owner_id = :owner_id",
+                    ExpressionAttributeValues={":owner_id": owner_id},
+                )
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+                counts["sentinels"] -= 1
+                counts["conflicts"] += 1
+                print(f"Device {owner_id}: {attribute} {value} is used by another device")
+
+        for fenced_id in device.device_fence or []:
+            counts["fences"] += 1
+            if not dry_run:
+                devices_repository.fences_table.put_item(
+                    Item={"fenced_id": str(fenced_id), "device_id": owner_id}
+                )
+    return counts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--dry-run", action="store_true", help="count the items without writing them"
+    )
+    args = parser.parse_args()
+
+    counts = backfill(di[DevicesRepository], args.dry_run)
+    print(
+        f"{counts['devices']} devices: {counts['sentinels']} sentinels,"
+        f" {counts['fences']} fence index items, {counts['conflicts']} conflicts"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+from typing import Any, Callable, List, Optional
+
+import pytest
+from bson import ObjectId
+
+from alexa_api.devices.repository import DevicesRepository
+from alexa_api.intents.alexa_data import Device
+from alexa_api.iot.connection import IotConnection
+from alexa_api.iot.repository import IotRepository
+from alexa_api.iot.timers import TimerRegistry
+from benchmarks.fakes import FakeAwsClients, FakeDatabase, FakeMqttClient, FakeTable, FakeWeather
+
+
+@pytest.fixture
+def database() -> FakeDatabase:
+    return FakeDatabase()
+
+
+@pytest.fixture
+def devices_table(database: FakeDatabase) -> FakeTable:
+    return database.table("devices", "device_id")
+
+
+@pytest.fixture
+def fences_table(database: FakeDatabase) -> FakeTable:
+    return database.table("fences", "fenced_id", "device_id")
+
+
+@pytest.fixture
+def devices_repository(devices_table: FakeTable, fences_table: FakeTable) -> DevicesRepository:
+    # every argument is positional, so kink doesn't resolve any of them
+    return DevicesRepository(devices_table, fences_table)
+
+
+@pytest.fixture
+def mqtt(devices_table: FakeTable) -> FakeMqttClient:
+    return FakeMqttClient(devices_table, device_latency=0.01)
+
+
+@pytest.fixture
+def iot_repository(
+    mqtt: FakeMqttClient, devices_repository: DevicesRepository, devices_table: FakeTable
+) -> IotRepository:
+    return IotRepository(
+        IotConnection(lambda: mqtt),
+        devices_repository,
+        FakeWeather(),
+        FakeAwsClients(),
+        TimerRegistry(devices_table),
+    )
+
+
+@pytest.fixture
+def make_device(devices_repository: DevicesRepository) -> Callable[..., Device]:
+    positions = iter(range(1000))
+
+    def _make_device(device_fence: Optional[List[Any]] = None, **fields: Any) -> Device:
+        position = next(positions)
+        device = Device(
+            name=f"device {position}",
+            description=None,
+            position=fields.pop("position", position),
+            GPIO=fields.pop("GPIO", position),
+            device_fence=[ObjectId(str(fence)) for fence in device_fence] if device_fence else None,
+            **fields,
+        )
+        devices_repository.insert(device)
+        return device
+
+    return _make_device
@@ -0,0 +1,31 @@
+from typing import Any
+
+from alexa_api.iot import connection
+from alexa_api.iot.connection import IotConnection
+from benchmarks.fakes import FakeMqttClient, FakeTable
+
+
+def test_connection_is_reused_while_alive(devices_table: FakeTable) -> None:
+    mqtt = FakeMqttClient(devices_table)
+    iot_connection = IotConnection(lambda: mqtt)
+
+    iot_connection.publish("topic", '{"state": {}}', 1)
+    iot_connection.publish("topic", '{"state": {}}', 1)
+
+    assert iot_connection.metrics["connects"] == 1
+    assert iot_connection.metrics["reuses"] == 1
+
+
+def test_idle_connection_is_made_again(devices_table: FakeTable, monkeypatch: Any) -> None:
+    # the broker closes it while the container is frozen, unnoticed by the client
+    monkeypatch.setattr(connection, "IOT_KEEP_ALIVE", 0)
+    mqtt = FakeMqttClient(devices_table)
+    iot_connection = IotConnection(lambda: mqtt)
+
+    iot_connection.subscribe("topic", 1, print)
+    iot_connection.subscribe("topic", 1, print)
+
+    assert iot_connection.metrics["connects"] == 2
+    assert iot_connection.metrics["expired"] == 1
+    assert iot_connection.metrics["reuses"] == 0
+    assert "topic" in mqtt._subscriptions
@@ -0,0 +1,65 @@
+from typing import Callable, Dict, List, Optional
+
+import pytest
+from bson import ObjectId
+
+from alexa_api.devices import DEVICES_PAGE_MAX_LIMIT
+from alexa_api.devices.repository import DevicesRepository
+from alexa_api.devices.service import GetDeviceListRequest, encode_cursor
+from alexa_api.errors import BadRequest
+from alexa_api.intents.alexa_data import Device
+
+
+def test_cursor_round_trip() -> None:
+    start_key = {"device_id": str(ObjectId())}
+
+    request = GetDeviceListRequest("10", encode_cursor(start_key))
+
+    assert request.limit == 10
+    assert request.start_key == start_key
+    assert request.paginated
+
+
+def test_without_parameters_the_list_is_not_paginated() -> None:
+    request = GetDeviceListRequest(None, None)
+
+    assert request.start_key is None
+    assert not request.paginated
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not a cursor",
+        encode_cursor({"device_id": "not an object id"}),
+        encode_cursor({"position#1": "sentinel"}),
+    ],
+)
+def test_invalid_cursor_is_a_bad_request(cursor: str) -> None:
+    with pytest.raises(BadRequest):
+        GetDeviceListRequest(None, cursor)
+
+
+@pytest.mark.parametrize("limit", ["0", str(DEVICES_PAGE_MAX_LIMIT + 1), "ten"])
+def test_invalid_limit_is_a_bad_request(limit: str) -> None:
+    with pytest.raises(BadRequest):
+        GetDeviceListRequest(limit, None)
+
+
+def test_pages_cover_every_device_once(
+    devices_repository: DevicesRepository, make_device: Callable[..., Device]
+) -> None:
+    created = {str(make_device().device_id) for _ in range(7)}
+
+    listed: List[str] = []
+    start_key: Optional[Dict] = None
+    while True:
+        devices, start_key = devices_repository.get_page(3, start_key)
+        assert len(devices) <= 3
+        listed += [str(device.device_id) for device in devices]
+        if start_key is None:
+            break
+        # as a client would, through the cursor
+        start_key = GetDeviceListRequest(None, encode_cursor(start_key)).start_key
+
+    assert sorted(listed) == sorted(created)
@@ -0,0 +1,206 @@
+from typing import Callable, Set
+
+import pytest
+from bson import ObjectId
+
+from alexa_api.devices.repository import TRANSACT_WRITE_LIMIT, DevicesRepository
+from alexa_api.errors import BadRequest, RecordExists, RecordNotFound, UpdateConflict
+from alexa_api.intents.alexa_data import Device
+from benchmarks.fakes import FakeTable
+
+
+def fenced_by(fences_table: FakeTable, device: Device) -> Set[str]:
+    return {
+        item["device_id"]
+        for item in fences_table.items.values()
+        if item["fenced_id"] == str(device.device_id)
+    }
+
+
+def test_insert_indexes_the_fences(
+    fences_table: FakeTable, make_device: Callable[..., Device]
+) -> None:
+    fence = make_device()
+    device = make_device(device_fence=[fence.device_id])
+
+    assert fenced_by(fences_table, fence) == {str(device.device_id)}
+    assert fenced_by(fences_table, device) == set()
+
+
+def test_insert_rejects_an_unknown_fence(
+    devices_table: FakeTable, make_device: Callable[..., Device]
+) -> None:
+    with pytest.raises(RecordNotFound):
+        make_device(device_fence=[ObjectId()])
+    assert not devices_table.items
+
+
+def test_update_fields_moves_the_fence_index(
+    devices_repository: DevicesRepository,
+    fences_table: FakeTable,
+    make_device: Callable[..., Device],
+) -> None:
+    first = make_device()
+    second = make_device()
+    device = make_device(device_fence=[first.device_id])
+
+    devices_repository.update_fields(
+        device.device_id,
+        {"device_fence": [second.device_id]},
+        devices_repository.get(device.device_id, consistent=True),
+    )
+
+    assert fenced_by(fences_table, first) == set()
+    assert fenced_by(fences_table, second) == {str(device.device_id)}
+
+
+def test_update_fields_without_expected_writes_the_fence_in_one_transaction(
+    devices_repository: DevicesRepository,
+    fences_table: FakeTable,
+    make_device: Callable[..., Device],
+) -> None:
+    first = make_device()
+    device = make_device(device_fence=[first.device_id])
+
+    with pytest.raises(RecordNotFound):
+        devices_repository.update_fields(device.device_id, {"device_fence": [ObjectId()]})
+    assert devices_repository.get(device.device_id).device_fence == [first.device_id]
+    assert fenced_by(fences_table, first) == {str(device.device_id)}
+
+    second = make_device()
+    devices_repository.update_fields(device.device_id, {"device_fence": [second.device_id]})
+    assert fenced_by(fences_table, first) == set()
+    assert fenced_by(fences_table, second) == {str(device.device_id)}
+
+
+def test_update_fields_does_not_recreate_a_deleted_device(
+    devices_repository: DevicesRepository,
+    devices_table: FakeTable,
+    make_device: Callable[..., Device],
+) -> None:
+    device = make_device()
+    devices_repository.delete(device.device_id)
+
+    with pytest.raises(RecordNotFound):
+        devices_repository.update_fields(device.device_id, {"status": True})
+    assert not devices_table.items
+
+
+def test_delete_drops_the_device_from_the_fences_of_others(
+    devices_repository: DevicesRepository,
+    fences_table: FakeTable,
+    make_device: Callable[..., Device],
+) -> None:
+    fence = make_device()
+    device = make_device()
+    fencing = make_device(device_fence=[device.device_id, fence.device_id])
+
+    devices_repository.delete(device.device_id)
+
+    assert fenced_by(fences_table, device) == set()
+    assert fenced_by(fences_table, fence) == {str(fencing.device_id)}
+    assert devices_repository.get(fencing.device_id).device_fence == [fence.device_id]
+
+
+def test_oversized_transactions_are_rejected(devices_repository: DevicesRepository) -> None:
+    # split in several calls the write would no longer be atomic
+    with pytest.raises(BadRequest):
+        devices_repository._transact_write([{}] * (TRANSACT_WRITE_LIMIT + 1))
+
+
+def test_update_fields_bumps_the_version(
+    devices_repository: DevicesRepository, make_device: Callable[..., Device]
+) -> None:
+    device = make_device()
+
+    devices_repository.update_fields(
+        device.device_id, {"name": "renamed"}, devices_repository.get(device.device_id)
+    )
+
+    assert devices_repository.get(device.device_id).version == 1
+
+
+def test_update_fields_rejects_a_stale_read(
+    devices_repository: DevicesRepository, make_device: Callable[..., Device]
+) -> None:
+    device = make_device()
+    stale = devices_repository.get(device.device_id)
+    devices_repository.update_fields(device.device_id, {"name": "first"}, stale)
+
+    with pytest.raises(UpdateConflict):
+        devices_repository.update_fields(device.device_id, {"name": "second"}, stale)
+    assert devices_repository.get(device.device_id).name == "first"
+
+
+def sentinels(devices_table: FakeTable) -> Set[str]:
+    return {item["device_id"] for item in devices_table.items.values() if "owner_id" in item}
+
+
+def test_insert_writes_the_sentinels(
+    devices_table: FakeTable, make_device: Callable[..., Device]
+) -> None:
+    make_device(position=1, GPIO=2)
+    make_device(position=3, GPIO=4)
+
+    assert sentinels(devices_table) == {"position#1", "GPIO#2", "position#3", "GPIO#4"}
+
+
+@pytest.mark.parametrize("attribute", ["position", "GPIO"])
+def test_insert_rejects_a_taken_position_or_gpio(
+    devices_table: FakeTable, make_device: Callable[..., Device], attribute: str
+) -> None:
+    make_device(position=1, GPIO=1)
+    stored = len(devices_table.items)
+
+    with pytest.raises(RecordExists):
+        make_device(**{"position": 2, "GPIO": 2, attribute: 1})
+    assert len(devices_table.items) == stored
+
+
+def test_update_fields_moves_the_sentinels(
+    devices_repository: DevicesRepository,
+    devices_table: FakeTable,
+    make_device: Callable[..., Device],
+) -> None:
+    device = make_device(position=1, GPIO=1)
+
+    devices_repository.update_fields(
+        device.device_id, {"position": 2}, devices_repository.get(device.device_id)
+    )
+
+    assert sentinels(devices_table) == {"position#2", "GPIO#1"}
+
+
+def test_update_fields_rejects_a_taken_position(
+    devices_repository: DevicesRepository, make_device: Callable[..., Device]
+) -> None:
+    make_device(position=1, GPIO=1)
+    device = make_device(position=2, GPIO=2)
+
+    with pytest.raises(RecordExists):
+        devices_repository.update_fields(
+            device.device_id, {"position": 1}, devices_repository.get(device.device_id)
+        )
+    assert devices_repository.get(device.device_id).position == 2
+
+
+def test_delete_frees_the_sentinels(
+    devices_repository: DevicesRepository,
+    devices_table: FakeTable,
+    make_device: Callable[..., Device],
+) -> None:
+    make_device(position=1, GPIO=1)
+    device = make_device(position=2, GPIO=2)
+
+    devices_repository.delete(device.device_id)
+
+    assert sentinels(devices_table) == {"position#1", "GPIO#1"}
+
+
+def test_insert_accepts_a_fence_listed_twice(
+    fences_table: FakeTable, make_device: Callable[..., Device]
+) -> None:
+    fence = make_device()
+    device = make_device(device_fence=[fence.device_id, fence.device_id])
+
+    assert fenced_by(fences_table, fence) == {str(device.device_id)}
@@ -0,0 +1,61 @@
+from typing import Any, Callable
+
+import pytest
+
+from alexa_api.intents.alexa_data import Device
+from alexa_api.iot.iot import IotErr
+from alexa_api.iot.repository import IotRepository
+from benchmarks.fakes import FakeMqttClient, FakeTable
+
+
+class OfflineReports(FakeMqttClient):
+    """Devices still obey, but the reported topic can't be subscribed"""
+
+    def subscribe(self, topic: str, qos: int, callback: Any) -> bool:
+        raise RuntimeError("subscription refused")
+
+
+@pytest.fixture(params=[FakeMqttClient, OfflineReports], ids=["reported", "polling"])
+def mqtt(request: Any, devices_table: FakeTable) -> FakeMqttClient:
+    # every test runs against the reported topic and the polling fallback
+    return request.param(devices_table, device_latency=0.01)
+
+
+def test_confirm_status(
+    iot_repository: IotRepository, make_device: Callable[..., Device], mqtt: FakeMqttClient
+) -> None:
+    device = make_device()
+    iot_repository.listen_reported()
+    assert iot_repository.reports_available is not isinstance(mqtt, OfflineReports)
+
+    iot_repository.send_order(device.device_id, True)
+
+    assert iot_repository.confirm_status(device, True, timeout=2)["err"] == IotErr.CONFIRMED
+
+
+def test_confirm_status_times_out(
+    iot_repository: IotRepository, make_device: Callable[..., Device]
+) -> None:
+    device = make_device()
+    iot_repository.listen_reported()
+
+    # the device obeys the order, not the status being waited for
+    iot_repository.send_order(device.device_id, False)
+
+    assert iot_repository.confirm_status(device, True, timeout=0.3)["err"] == IotErr.FAILED
+
+
+def test_confirm_statuses_share_one_deadline(
+    iot_repository: IotRepository, make_device: Callable[..., Device]
+) -> None:
+    devices = [make_device() for _ in range(3)]
+    iot_repository.listen_reported()
+    iot_repository.send_orders({device.device_id: True for device in devices})
+
+    confirmations = iot_repository.confirm_statuses(
+        [(device, True) for device in devices] + [(make_device(), True)], timeout=0.5
+    )
+
+    assert [confirmation["err"] for confirmation in confirmations.values()] == [
+        IotErr.CONFIRMED, IotErr.CONFIRMED, IotErr.CONFIRMED, IotErr.FAILED
+    ]
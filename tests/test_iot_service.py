@@ -0,0 +1,71 @@
+import time
+from typing import Any, Callable
+
+import pytest
+
+from alexa_api.intents.alexa_data import Device
+from alexa_api.iot.config_bundle import ConfigBundle
+from alexa_api.iot.iot import IotErr
+from alexa_api.iot.repository import IotRepository
+from alexa_api.iot.service import GroupOrderRequest, IotService, SendOrderRequest
+from benchmarks.fakes import FakeMqttClient, FakeTable
+
+
+class SlowSubscription(FakeMqttClient):
+    def subscribe(self, topic: str, qos: int, callback: Any) -> bool:
+        time.sleep(0.05)
+        return super().subscribe(topic, qos, callback)
+
+
+@pytest.fixture
+def mqtt(devices_table: FakeTable) -> FakeMqttClient:
+    return SlowSubscription(devices_table, device_latency=0.01)
+
+
+@pytest.fixture
+def iot_service(iot_repository: IotRepository) -> IotService:
+    return IotService(
+        iot_repository,
+        iot_repository.devices_repository,
+        ConfigBundle(iot_repository.aws_clients),
+        iot_repository.timer_registry,
+    )
+
+
+def test_rejected_order_does_not_leave_the_subscription_running(
+    iot_service: IotService, make_device: Callable[..., Device], mqtt: FakeMqttClient
+) -> None:
+    device = make_device()
+
+    response = iot_service.send_order(SendOrderRequest(str(device.device_id), "", "5"))
+
+    assert response["err"] == IotErr.EXISTING
+    assert mqtt._subscriptions
+
+
+def test_rejected_group_order_does_not_leave_the_subscription_running(
+    iot_service: IotService, make_device: Callable[..., Device], mqtt: FakeMqttClient
+) -> None:
+    fence = make_device(status=True)
+    device = make_device(device_fence=[fence.device_id])
+
+    results = iot_service.send_group_order(
+        GroupOrderRequest({str(device.device_id): True, str(fence.device_id): True}, 5)
+    )
+
+    assert [result["err"] for result in results.values()] == [
+        IotErr.DEVICE_FENCED, IotErr.EXISTING
+    ]
+    assert mqtt._subscriptions
+
+
+def test_group_order_is_confirmed(
+    iot_service: IotService, make_device: Callable[..., Device]
+) -> None:
+    devices = [make_device() for _ in range(3)]
+
+    results = iot_service.send_group_order(
+        GroupOrderRequest({str(device.device_id): True for device in devices}, 2)
+    )
+
+    assert [result["err"] for result in results.values()] == [IotErr.CONFIRMED] * 3
@@ -0,0 +1,16 @@
+import json
+from typing import Any
+
+from alexa_api.metrics import EMF_MAX_VALUES, invocation, span
+
+
+def test_latencies_are_split_into_arrays_cloudwatch_accepts(capsys: Any) -> None:
+    with invocation("handler"):
+        for _ in range(EMF_MAX_VALUES * 2 + 1):
+            with span("dynamodb", "GetItem"):
+                pass
+
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    latencies = [line["latency"] for line in lines if "latency" in line]
+
+    assert [len(values) for values in latencies] == [EMF_MAX_VALUES, EMF_MAX_VALUES, 1]
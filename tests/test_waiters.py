@@ -0,0 +1,27 @@
+import time
+
+from alexa_api.iot.waiters import ReportedWaiters
+
+
+def test_report_after_the_order_confirms_it() -> None:
+    waiters = ReportedWaiters()
+    since = time.monotonic()
+    waiters.resolve("device", True)
+
+    assert waiters.wait("device", True, timeout=0, since=since)
+
+
+def test_report_before_the_order_does_not_confirm_it() -> None:
+    waiters = ReportedWaiters()
+    waiters.resolve("device", True)
+    since = time.monotonic()
+
+    assert not waiters.wait("device", True, timeout=0.01, since=since)
+
+
+def test_report_of_another_status_does_not_confirm_it() -> None:
+    waiters = ReportedWaiters()
+    since = time.monotonic()
+    waiters.resolve("device", False)
+
+    assert not waiters.wait("device", True, timeout=0.01, since=since)